@@ -1,14 +1,24 @@
 from lib.actions import attack_opp, dig_rubble, deliver_payload, power_recharge, evade
+from lib.distance_fields import DistanceFields
 from lib.inventory import Inventory
+from lib.miner_assignment import MinerAssignment
+from lib.occupancy import OccupancyGrid
+from lib.path_cache import PathCache
+from lib.profiler import profiler
+from lib.pathing import move_toward
 from lib.queue_builder import Queue
+from lib.reservations import ReservationTable
 from lib.setup_factories import setup
-from lux.kit import obs_to_game_state, EnvConfig
+from lib.turn_budget import TurnBudget
+from lux.kit import update_game_state, EnvConfig
+from lux.unit import LIGHT, HEAVY
 from lib.utils import *  # it's ok, these are just helper functions
 
 
 class Agent:
     def __init__(self, player: str, env_cfg: EnvConfig) -> None:
         self.old_units = []
+        self.game_state = None  # updated in place every step by update_game_state
         self.inventory = Inventory([], dict(), dict(), dict())
         self.homers = []
         self.actions = dict()
@@ -16,7 +26,13 @@ class Agent:
 
         self.opp_strains = []
         self.strains = []
-        self.new_positions = []
+        self.new_positions = OccupancyGrid(env_cfg.map_size)  # tiles taken next turn
+        self.reservations = ReservationTable(env_cfg.map_size, env_cfg.UNIT_ACTION_QUEUE_SIZE)
+        self.distance_fields = DistanceFields(env_cfg)
+        self.path_cache = PathCache(env_cfg.map_size)
+        self.miner_assignment = MinerAssignment(self)
+        self.analytics = None  # MapAnalytics, built during the bidding turn
+        self.turn_budget = TurnBudget(env_cfg.max_episode_length)
         self.player = player
         self.opp_player = "player_1" if self.player == "player_0" else "player_0"
         np.random.seed(0)
@@ -32,7 +48,12 @@ class Agent:
         new_acts = dict()
         for uid, acts in self.prev_actions.items():
             if isinstance(acts, list):
-                new_acts[uid] = acts[1:]
+                if len(acts) > 0 and acts[0][5] > 1:  # the engine counts n down before it pops the action
+                    first = acts[0].copy()
+                    first[5] -= 1
+                    new_acts[uid] = [first] + acts[1:]
+                else:
+                    new_acts[uid] = acts[1:]
             elif isinstance(acts, int):
                 continue
         self.prev_actions = new_acts
@@ -56,38 +77,59 @@ class Agent:
                 else:
                     new_pos = unit.pos
 
-                append_to_new = True
-                for pos in self.new_positions:
-                    if new_pos[0] == pos[0] and new_pos[1] == pos[1]:
-                        append_to_new = False
-                        self.prev_actions[uid] = []
-                        break
-                if append_to_new:
-                    self.new_positions.append(new_pos)
+                if self.new_positions.is_taken(new_pos):
+                    self.prev_actions[uid] = []
+                else:
+                    self.new_positions.claim(new_pos)
+                    self.reservations.reserve_queue(uid, unit.pos, act)
+        for uid, unit in units.items():
+            if uid not in self.reservations.owned:  # no queue to follow, so it stays where it is
+                self.reservations.reserve(uid, [unit.pos])
 
     def remove_new_position(self, unit):
+        self.reservations.release(unit.unit_id)
         if unit.unit_id in self.prev_actions.keys() and len(self.prev_actions[unit.unit_id]) > 0:
             if self.prev_actions[unit.unit_id][0][0] == 0:
                 new_pos = next_position(unit, self.prev_actions[unit.unit_id][0][1])
             else:
                 new_pos = unit.pos
 
-            for i, pos in enumerate(self.new_positions):
-                if new_pos[0] == pos[0] and new_pos[1] == pos[1]:
-                    del self.new_positions[i]
-                    break
+            self.new_positions.release(new_pos)
 
     def update_actions(self, unit, queue):
+        if isinstance(queue, list):
+            queue = compress_queue(queue)[:self.env_cfg.UNIT_ACTION_QUEUE_SIZE]
         if isinstance(queue, list) and len(queue) > 0:
             if queue[0][0] == 0:  # it's a move command
                 new_pos = next_position(unit, queue[0][1])
-                self.new_positions.append(new_pos)
+                self.new_positions.claim(new_pos)
             else:
-                self.new_positions.append(unit.pos)
+                self.new_positions.claim(unit.pos)
+        if isinstance(queue, list):
+            self.reservations.reserve_queue(unit.unit_id, unit.pos, queue)
 
         self.actions[unit.unit_id] = queue
         self.prev_actions[unit.unit_id] = queue
 
+    def fallback_actions(self, unit, home_f, game_state):
+        """
+        What a unit does when the turn is running out of time: carry on with its queue if it has one, head home
+        with a greedy step if it carries anything, else wait where it is
+        """
+        self.turn_budget.fallbacks += 1
+        if len(self.prev_actions[unit.unit_id]) > 0:  # its queue is claimed and reserved in update_new_positions
+            return
+        if unit.cargo.ice + unit.cargo.ore > 0 and not factory_adjacent(home_f.pos, unit):
+            queue = move_toward(home_f.pos, unit, self.player, self.opp_player, self.new_positions, game_state)
+            self.update_actions(unit, queue)
+        elif len(unit.action_queue) > 0:
+            # the engine would keep running a queue we dropped while its tile is reserved as if it stayed put,
+            # so replace that queue with a wait
+            self.update_actions(unit, [unit.move(0)])
+        else:
+            self.update_actions(unit, [])
+            self.new_positions.claim(unit.pos)
+
     def heavy_actions(self, unit, title, home_f, game_state, obs):
         adjacent_to_factory = factory_adjacent(home_f.pos, unit)
         if unit.power < 30 and not adjacent_to_factory:
@@ -97,13 +139,15 @@ class Agent:
         elif adjacent_to_factory and unit.power < 300:
             self.remove_new_position(unit)
             self.prev_actions[unit.unit_id] = []
-            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions, game_state)
+            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions,
+                                   self.distance_fields, game_state)
             self.update_actions(unit, queue)
             return
         elif unit.power < 100:
             self.remove_new_position(unit)
             self.prev_actions[unit.unit_id] = []
-            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions, game_state)
+            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions,
+                                   self.distance_fields, game_state)
             self.update_actions(unit, queue)
             return
         if game_state.board.rubble[unit.pos[0]][unit.pos[1]] > 0:
@@ -128,8 +172,8 @@ class Agent:
 
         if home_f.cargo.water < 100 < unit.cargo.ice:  # didn't know you could do this chained comparison
             self.remove_new_position(unit)
-            queue = deliver_payload(unit, 0, unit.cargo.ice, self.player, self.opp_player, self.new_positions, home_f,
-                                    game_state)
+            queue = deliver_payload(unit, 0, unit.cargo.ice, self.player, self.opp_player, self.new_positions,
+                                    self.distance_fields, home_f, game_state)
             self.update_actions(unit, queue)
             return
 
@@ -154,8 +198,7 @@ class Agent:
                 return
             else:
                 queue = deliver_payload(unit, 0, unit.cargo.ice, self.player, self.opp_player, self.new_positions,
-                                        home_f,
-                                        game_state)
+                                        self.distance_fields, home_f, game_state)
                 self.update_actions(unit, queue)
                 return
 
@@ -168,11 +211,13 @@ class Agent:
         if unit.power < 50:
             self.remove_new_position(unit)
             if game_state.real_env_steps >= 900:
-                closest_f = get_closest_factory(game_state.factories[self.player], unit)
-                queue = power_recharge(unit, closest_f, self.player, self.opp_player, self.new_positions, game_state)
+                closest_f = self.distance_fields.closest_factory(game_state.factories[self.player], unit)
+                queue = power_recharge(unit, closest_f, self.player, self.opp_player, self.new_positions,
+                                       self.distance_fields, game_state)
                 self.update_actions(unit, queue)
                 return
-            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions, game_state)
+            queue = power_recharge(unit, home_f, self.player, self.opp_player, self.new_positions,
+                                   self.distance_fields, game_state)
             self.update_actions(unit, queue)
             return
 
@@ -183,19 +228,18 @@ class Agent:
                 pickup_amt = 150 - unit.power
                 self.actions[unit.unit_id] = [unit.pickup(4, pickup_amt, n=1)]
                 return
-            opp_lichen = []
-            for i in self.opp_strains:
-                opp_lichen.extend(np.argwhere((game_state.board.lichen_strains == i)))
+            opp_lichen = game_state.layers.lichen_tiles(self.opp_strains)
             if len(self.prev_actions[unit.unit_id]) == 0 and np.sum(opp_lichen) > 0:
                 self.remove_new_position(unit)
-                queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions, game_state, obs)
+                queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions,
+                                   self.reservations, self.path_cache, self.distance_fields, game_state, obs)
                 self.update_actions(unit, queue)
                 return
 
         if unit.cargo.ore > 0 and title != "miner":
             self.remove_new_position(unit)
-            queue = deliver_payload(unit, 1, unit.cargo.ore, self.player, self.opp_player, self.new_positions, home_f,
-                                    game_state)
+            queue = deliver_payload(unit, 1, unit.cargo.ore, self.player, self.opp_player, self.new_positions,
+                                    self.distance_fields, home_f, game_state)
             self.update_actions(unit, queue)
             return
 
@@ -204,13 +248,13 @@ class Agent:
             if unit.cargo.ore >= 25 and home_unit_inv < 4:
                 self.remove_new_position(unit)
                 queue = deliver_payload(unit, 1, unit.cargo.ore, self.player, self.opp_player, self.new_positions,
-                                        home_f, game_state)
+                                        self.distance_fields, home_f, game_state)
                 self.update_actions(unit, queue)
                 return
             if unit.cargo.ore > 98:
                 self.remove_new_position(unit)
                 queue = deliver_payload(unit, 1, unit.cargo.ore, self.player, self.opp_player, self.new_positions,
-                                        home_f, game_state)
+                                        self.distance_fields, home_f, game_state)
                 self.update_actions(unit, queue)
                 return
 
@@ -224,9 +268,7 @@ class Agent:
                     digs = (unit.power - unit.action_queue_cost(game_state) - 20) // (unit.dig_cost(game_state))
                     if digs > 20:
                         digs = 20
-                    queue = []
-                    for i in range(digs):
-                        queue.append(unit.dig(n=1))
+                    queue = [unit.dig(n=digs)] if digs > 0 else []
                     self.update_actions(unit, queue)
                     return
                 elif unit.cargo.ore <= 98 and len(self.prev_actions[unit.unit_id]) == 0:
@@ -240,39 +282,31 @@ class Agent:
                 return
 
         if title == "digger" and game_state.real_env_steps > 700:
-            opp_lichen, my_lichen = [], []
-            for i in self.opp_strains:
-                opp_lichen.extend(np.argwhere((game_state.board.lichen_strains == i)))
-            for i in self.strains:
-                my_lichen.extend(np.argwhere((game_state.board.lichen_strains == i)))
+            opp_lichen = game_state.layers.lichen_tiles(self.opp_strains)
             if len(opp_lichen) > 10:
                 closest_lichen = closest_opp_lichen(self.opp_strains, home_f, self.player, self.new_positions, game_state, obs)
-                if distance_to(unit.pos, closest_lichen) < 12 and game_state.real_env_steps < 900:
+                close = closest_lichen is not None and distance_to(unit.pos, closest_lichen) < 12
+                if close and game_state.real_env_steps < 900:
                     self.remove_new_position(unit)
-                    queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions, game_state, obs)
+                    queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions,
+                                       self.reservations, self.path_cache, self.distance_fields, game_state, obs)
                     self.update_actions(unit, queue)
                     return
                 elif game_state.real_env_steps >= 900:
                     self.remove_new_position(unit)
-                    queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions, game_state, obs)
+                    queue = attack_opp(unit, self.player, self.opp_player, self.opp_strains, self.new_positions,
+                                       self.reservations, self.path_cache, self.distance_fields, game_state, obs)
                     self.update_actions(unit, queue)
                     return
 
         if len(self.prev_actions[unit.unit_id]) == 0:
             rubble_here = game_state.board.rubble[unit.pos[0]][unit.pos[1]]
             if rubble_here > 0:
-                diggable = True
-                for pos in self.new_positions:
-                    if unit.pos[0] == pos[0] and unit.pos[1] == pos[1]:
-                        diggable = False
-                        break
-                if diggable:
+                if not self.new_positions.is_taken(unit.pos):
                     digs = (unit.power - unit.action_queue_cost(game_state) - 20) // (unit.dig_cost(game_state))
                     if digs > 20:
                         digs = 20
-                    queue = []
-                    for i in range(digs):
-                        queue.append(unit.dig(n=1))
+                    queue = [unit.dig(n=digs)] if digs > 0 else []
                     self.update_actions(unit, queue)
                     return
             queue = dig_rubble(unit, self.player, self.opp_player, self.new_positions, game_state, obs)
@@ -281,20 +315,27 @@ class Agent:
 
     def act(self, step: int, obs, remainingOverageTime: int = 60):
         # SETUP
-        game_state = obs_to_game_state(step, self.env_cfg, obs)
+        self.turn_budget.start(obs["real_env_steps"], remainingOverageTime)
+        with profiler.phase("update_game_state"):  # obs_to_game_state on the first step
+            self.game_state = update_game_state(self.game_state, step, self.env_cfg, obs)
+        game_state = self.game_state
         factories = game_state.factories[self.player]
         units = game_state.units[self.player]
         opp_factories = game_state.factories[self.opp_player]
         my_factory_centers = [f.pos for i, f in factories.items()]
-        opp_factory_centers = np.array([f.pos for i, f in opp_factories.items()])
-        opp_factory_tiles = get_factory_tiles(opp_factory_centers)
+        opp_factory_tiles = game_state.layers.factory_tiles(self.opp_player)
+        self.distance_fields.update(game_state, self.player, self.opp_player, obs["board"].get("rubble_changes"))
+        self.path_cache.invalidate(obs["board"].get("rubble_changes", []))
 
         self.actions = dict()
         self.inventory.factory_types = dict()
         self.update_action_queue()
-        self.new_positions = my_factory_centers
-        self.new_positions.extend(opp_factory_tiles)
+        static_positions = my_factory_centers + list(opp_factory_tiles)
+        self.new_positions.reset(static_positions)
+        self.reservations.reset()
+        self.reservations.block(static_positions)
         self.update_new_positions(units)
+        self.miner_assignment.reset()
 
         # STRAINS
         if game_state.real_env_steps == 1:
@@ -304,15 +345,19 @@ class Agent:
                 self.strains.append(factory.strain_id)
 
         # UNITS
-        for unit_id, unit in units.items():
+        new_units = set(game_state.added_units.get(self.player, []))
+        planning_order = self.turn_budget.order(game_state.unit_table(self.player),
+                                                game_state.unit_table(self.opp_player))
+        for unit_id, urgent in planning_order:
+            unit = units[unit_id]
             # SETUP
             if unit.unit_id not in self.actions.keys():
                 self.actions[unit.unit_id] = []
             if unit.unit_id not in self.prev_actions.keys():
                 self.prev_actions[unit.unit_id] = []
 
-            closest_f = get_closest_factory(factories, unit)
-            if unit_id not in self.inventory.all_units:  # then it's new and needs to be added to inventory
+            closest_f = self.distance_fields.closest_factory(factories, unit)
+            if unit_id in new_units:  # then it's new and needs to be added to inventory
                 self.inventory.factory_units[closest_f.unit_id].append(unit_id)
                 self.inventory.all_units.append(unit_id)
 
@@ -325,15 +370,16 @@ class Agent:
                 home_factory = closest_f
 
             # ATTACK EVASION
-            evading, evasion_queue = evade(unit, home_factory, self.player, self.opp_player, self.new_positions,
-                                           game_state)
+            with profiler.phase("evade"):
+                evading, evasion_queue = evade(unit, home_factory, self.player, self.opp_player,
+                                               self.new_positions, self.distance_fields, game_state)
             if evading:
                 self.remove_new_position(unit)
                 self.update_actions(unit, evasion_queue)
                 continue
 
             # HEAVY
-            if unit.unit_type == "HEAVY":
+            if unit.type_code == HEAVY:
                 if home_id not in self.inventory.factory_types.keys():
                     self.inventory.factory_types[home_id] = []
                 home_homers = self.inventory.factory_types[home_id].count("homer")
@@ -345,10 +391,11 @@ class Agent:
                     self.inventory.factory_types[home_id].append("sentry")
 
                 title = self.inventory.unit_title[unit_id]
-                self.heavy_actions(unit, title, home_factory, game_state, obs)
+                with profiler.phase("heavy_actions"):
+                    self.heavy_actions(unit, title, home_factory, game_state, obs)
 
             # LIGHT
-            elif unit.unit_type == "LIGHT":
+            elif unit.type_code == LIGHT:
                 if home_id not in self.inventory.factory_types.keys():
                     self.inventory.factory_types[home_id] = []
                 home_helpers = self.inventory.factory_types[home_id].count("helper")
@@ -372,43 +419,50 @@ class Agent:
                     if unit_id not in self.inventory.factory_units[home_id]:
                         self.inventory.factory_units[home_id].append(unit_id)
 
-                self.light_actions(unit, title, home_factory, game_state, obs)
+                if not urgent and self.turn_budget.running_low():  # heavies are always urgent
+                    with profiler.phase("fallback_actions"):
+                        self.fallback_actions(unit, home_factory, game_state)
+                else:
+                    with profiler.phase("light_actions"):
+                        self.light_actions(unit, title, home_factory, game_state, obs)
 
         # FACTORIES
-        for unit_id, factory in factories.items():
-            if unit_id not in self.inventory.factory_units.keys():
-                self.inventory.factory_units[unit_id] = []
-            if unit_id not in self.inventory.factory_types.keys():
-                self.inventory.factory_types[unit_id] = []
-            else:  # check if this factory's units exist in the game_state
-                self.inventory.factory_units[unit_id] = [uid for uid in self.inventory.factory_units[unit_id] if
-                                                         uid in units.keys()]
-
-            number_of_homers = self.inventory.factory_types[unit_id].count("homer")
-            if number_of_homers == 0 and factory.can_build_heavy(game_state):
-                self.actions[unit_id] = factory.build_heavy()
-                continue
-            else:
-                number_of_helpers = self.inventory.factory_types[unit_id].count("helper")
-                number_of_diggers = self.inventory.factory_types[unit_id].count("digger")
-                number_of_miners = self.inventory.factory_types[unit_id].count("miner")
-                if number_of_miners < 1 and factory.can_build_light(game_state):
-                    self.actions[unit_id] = factory.build_light()
-                    continue
-                elif number_of_helpers < 2 and factory.can_build_light(game_state):
-                    self.actions[unit_id] = factory.build_light()
-                    continue
-                elif number_of_diggers < 3 and factory.can_build_light(game_state):
-                    self.actions[unit_id] = factory.build_light()
+        with profiler.phase("factories"):
+            for unit_id, factory in factories.items():
+                if unit_id not in self.inventory.factory_units.keys():
+                    self.inventory.factory_units[unit_id] = []
+                if unit_id not in self.inventory.factory_types.keys():
+                    self.inventory.factory_types[unit_id] = []
+                else:  # check if this factory's units exist in the game_state
+                    self.inventory.factory_units[unit_id] = [uid for uid in self.inventory.factory_units[unit_id] if
+                                                             uid in units.keys()]
+
+                number_of_homers = self.inventory.factory_types[unit_id].count("homer")
+                if number_of_homers == 0 and factory.can_build_heavy(game_state):
+                    self.actions[unit_id] = factory.build_heavy()
                     continue
-                elif game_state.real_env_steps > 700 and factory.can_build_light(
-                        game_state) and game_state.real_env_steps % 10 == 0:
-                    self.actions[unit_id] = factory.build_light()
-                    continue
-
-            if factory.cargo.water > 50 and game_state.real_env_steps > 780:
-                self.actions[unit_id] = factory.water()
+                else:
+                    number_of_helpers = self.inventory.factory_types[unit_id].count("helper")
+                    number_of_diggers = self.inventory.factory_types[unit_id].count("digger")
+                    number_of_miners = self.inventory.factory_types[unit_id].count("miner")
+                    if number_of_miners < 1 and factory.can_build_light(game_state):
+                        self.actions[unit_id] = factory.build_light()
+                        continue
+                    elif number_of_helpers < 2 and factory.can_build_light(game_state):
+                        self.actions[unit_id] = factory.build_light()
+                        continue
+                    elif number_of_diggers < 3 and factory.can_build_light(game_state):
+                        self.actions[unit_id] = factory.build_light()
+                        continue
+                    elif game_state.real_env_steps > 700 and factory.can_build_light(
+                            game_state) and game_state.real_env_steps % 10 == 0:
+                        self.actions[unit_id] = factory.build_light()
+                        continue
+
+                if factory.cargo.water > 50 and game_state.real_env_steps > 780:
+                    self.actions[unit_id] = factory.water()
 
         # FINALIZE ACTIONS
-        actions_to_submit = self.finalize_action_queue()
+        with profiler.phase("finalize_action_queue"):
+            actions_to_submit = self.finalize_action_queue()
         return actions_to_submit
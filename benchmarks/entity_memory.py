@@ -0,0 +1,94 @@
+import argparse
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+'''
+Memory benchmark for the entity classes (Unit, Factory, UnitCargo). The units and factories of an observation are
+built the way obs_to_game_state builds them, as many times as there are turns, once with the lux package of the
+working tree and once with the lux package of an older git revision, e.g. the commit before the classes got
+__slots__. tracemalloc measures what the built entities hold on to, including their pos arrays.
+
+    python benchmarks/entity_memory.py --old <revision>
+
+late_game_obs.json is the full observation of a turn-900 game state (80 units, 11 factories).
+'''
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+
+def load_lux(root):
+    """imports lux.unit, lux.factory, lux.cargo and lux.config from the lux package under root"""
+    for name in [name for name in sys.modules if name == "lux" or name.startswith("lux.")]:
+        del sys.modules[name]
+    sys.path.insert(0, root)
+    try:
+        return [importlib.import_module(f"lux.{name}") for name in ("unit", "factory", "cargo", "config")]
+    finally:
+        sys.path.pop(0)
+
+
+def build_entities(obs, unit_mod, factory_mod, cargo_mod, env_cfg) -> list:
+    entities = []
+    for units in obs["units"].values():
+        for unit_data in units.values():
+            unit_data = dict(unit_data, pos=np.array(unit_data["pos"]))
+            unit = unit_mod.Unit(**unit_data, unit_cfg=env_cfg.ROBOTS[unit_data["unit_type"]], env_cfg=env_cfg)
+            unit.cargo = cargo_mod.UnitCargo(**unit_data["cargo"])
+            entities.append(unit)
+    for factories in obs["factories"].values():
+        for f_data in factories.values():
+            f_data = dict(f_data, pos=np.array(f_data["pos"]))
+            factory = factory_mod.Factory(**f_data, env_cfg=env_cfg)
+            factory.cargo = cargo_mod.UnitCargo(**f_data["cargo"])
+            entities.append(factory)
+    return entities
+
+
+def measure(name, root, obs, turns):
+    unit_mod, factory_mod, cargo_mod, config_mod = load_lux(root)
+    env_cfg = config_mod.EnvConfig()
+    tracemalloc.start()
+    kept = [build_entities(obs, unit_mod, factory_mod, cargo_mod, env_cfg) for _ in range(turns)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(turns):
+        build_entities(obs, unit_mod, factory_mod, cargo_mod, env_cfg)
+    build_ms = (time.perf_counter() - start) * 1000 / turns
+    n_entities = len(kept[0])
+    print(f"{name}: {n_entities} entities per turn, {size / turns / 1024:.1f} KiB per turn, "
+          f"{size / turns / n_entities:.0f} B per entity, built in {build_ms:.2f} ms per turn")
+
+
+def checkout_lux(revision, target):
+    """writes the lux package of a git revision into target"""
+    archive = subprocess.run(["git", "archive", "--format=tar", revision, "lux"], cwd=REPO, check=True,
+                             stdout=subprocess.PIPE).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--old", required=True, help="git revision whose lux package is the baseline")
+    parser.add_argument("--obs", default=os.path.join(HERE, "late_game_obs.json"))
+    parser.add_argument("--turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.obs) as f:
+        observation = json.load(f)
+    with tempfile.TemporaryDirectory() as old_root:
+        checkout_lux(args.old, old_root)
+        measure(f"old ({args.old})", old_root, observation, args.turns)
+    measure("new (working tree)", REPO, observation, args.turns)
@@ -2,34 +2,26 @@ import numpy as np
 import sys
 
 from lib.utils import closest_opp_lichen, direction_to, distance_to, factory_adjacent, get_target_tile
-from lib.pathing import move_toward, path_to
-from lib.dijkstra import dijkstras_path
+from lib.pathing import move_toward, positions_to_queue
+from lib.path_cache import planned_path
+from lux.unit import LIGHT, HEAVY
 
 
-def attack_opp(unit, player, opp_player, opp_strains, new_positions, game_state, obs):
+def attack_opp(unit, player, opp_player, opp_strains, new_positions, reservations, path_cache, distance_fields,
+               game_state, obs):
     closest_lichen = closest_opp_lichen(opp_strains, unit, player, new_positions, game_state, obs)
-    lichen_tiles = obs["board"]["lichen_strains"]
-    opp_lichen = np.argwhere(np.isin(lichen_tiles, opp_strains))
-    for pos in opp_lichen:
-        if pos[0] == unit.pos[0] and pos[1] == unit.pos[1]:
-            digs = (unit.power - unit.action_queue_cost(game_state) - 20) // (unit.dig_cost(game_state))
-            if digs > 20:
-                digs = 20
-            queue = []
-            for i in range(digs):
-                queue.append(unit.dig(n=1))
-            return queue
-    rubble_map = game_state.board.rubble
-    path = dijkstras_path(unit.unit_type, rubble_map, unit.pos, closest_lichen, new_positions)
-    if len(path) > 1:
-        queue = []
-        for i, pos in enumerate(path):
-            if i + 1 < len(path):
-                queue.append(path_to(unit, path[i], path[i + 1]))
-        queue = [act[0] for act in queue]
-        if len(queue) > 20:
-            queue = queue[:20]
+    if game_state.layers.lichen_mask(opp_strains)[unit.pos[0], unit.pos[1]]:
+        digs = (unit.power - unit.action_queue_cost(game_state) - 20) // (unit.dig_cost(game_state))
+        if digs > 20:
+            digs = 20
+        queue = [unit.dig(n=digs)] if digs > 0 else []
         return queue
+    if closest_lichen is None:  # no opponent lichen left that isn't taken
+        return dig_rubble(unit, player, opp_player, new_positions, game_state, obs)
+    path = planned_path(unit.unit_type, distance_fields, unit.pos, closest_lichen, reservations, unit.unit_id,
+                        path_cache)
+    if len(path) > 1:
+        return positions_to_queue(unit, path)
     else:
         return move_toward(closest_lichen, unit, player, opp_player, new_positions, game_state)
 
@@ -38,44 +30,36 @@ def dig_rubble(unit, player, opp_player, new_positions, game_state, obs):
     target_tile = get_target_tile("rubble", unit, player, new_positions, game_state, obs)
     if target_tile[0] == unit.pos[0] and target_tile[1] == unit.pos[1]:
         if unit.power >= unit.dig_cost(game_state) + unit.action_queue_cost(game_state) + 20:
-            if unit.unit_type == "LIGHT":
+            if unit.type_code == LIGHT:
                 expense = unit.power - 25
             else:
                 expense = unit.power - 80
             digs = expense // (unit.dig_cost(game_state))
             if digs > 20:
                 digs = 20
-            queue = []
-            for i in range(digs):
-                queue.append(unit.dig(n=1))
+            queue = [unit.dig(n=digs)] if digs > 0 else []
             return queue
     else:
         queue = move_toward(target_tile, unit, player, opp_player, new_positions, game_state)
         return queue
 
 
-def deliver_payload(unit, resource: int, amount: int, player, opp_player, new_positions, closest_f, game_state):
+def deliver_payload(unit, resource: int, amount: int, player, opp_player, new_positions, distance_fields, closest_f,
+                    game_state):
     direction = direction_to(unit.pos, closest_f.pos)
     adjacent_to_factory = factory_adjacent(closest_f.pos, unit)
     if adjacent_to_factory:
         return [unit.transfer(direction, resource, amount, n=1)]
     else:
-        if unit.unit_type == "HEAVY":
-            return move_toward(closest_f.pos, unit, player, opp_player, new_positions, game_state)
-        else:
-            return move_toward(closest_f.pos, unit, player, opp_player, new_positions, game_state)
+        next_tile = distance_fields.next_step(closest_f, unit.unit_type, unit.pos)
+        return move_toward(next_tile, unit, player, opp_player, new_positions, game_state)
 
 
-def power_recharge(unit, home_f, player, opp_player, new_positions, game_state):
+def power_recharge(unit, home_f, player, opp_player, new_positions, distance_fields, game_state):
     on_factory = factory_adjacent(home_f.pos, unit)
     if on_factory:
-        can_pickup = True
-        for pos in new_positions:
-            if unit.pos[0] == pos[0] and unit.pos[1] == pos[1]:
-                can_pickup = False
-                break
-        if can_pickup:
-            if unit.unit_type == "LIGHT":
+        if not new_positions.is_taken(unit.pos):
+            if unit.type_code == LIGHT:
                 pickup_amt = 150 - unit.power
             else:
                 if home_f.power < 500:
@@ -88,7 +72,8 @@ def power_recharge(unit, home_f, player, opp_player, new_positions, game_state):
                     pickup_amt = 2000 + (home_f.power % 1000)
             return [unit.pickup(4, pickup_amt, n=1)]
 
-    return move_toward(home_f.pos, unit, player, opp_player, new_positions, game_state)
+    next_tile = distance_fields.next_step(home_f, unit.unit_type, unit.pos)
+    return move_toward(next_tile, unit, player, opp_player, new_positions, game_state)
 
 
 def retreat(unit, opp_unit, home_f, game_state):
@@ -102,31 +87,32 @@ def retreat(unit, opp_unit, home_f, game_state):
             return [unit.move(direction, repeat=0)]
 
 
-def evade(unit, home_factory, player, opp_player, new_positions, game_state):
-    for u_id, u in game_state.units[opp_player].items():
-        o_facto = [op.pos.tolist() for op in game_state.factories[opp_player].values()]
-        if unit.unit_type == "HEAVY" and unit.power >= 40:
-            attacker_dist = distance_to(unit.pos, u.pos)
-            if attacker_dist < 2 and u.unit_type == "HEAVY":
-                if u.pos.tolist() not in o_facto:  # if the enemy is not on a factory
-                    if unit.power <= u.power:
-                        queue = retreat(unit, u, home_factory, game_state)
-                        evading = True
-                        return evading, queue
-                    else:
-                        queue = move_toward(u.pos, unit, player, opp_player, new_positions, game_state, evading=True)
-                        evading = True
-                        return evading, queue
-        elif unit.unit_type == "LIGHT":
-            attacker_dist = distance_to(unit.pos, u.pos)
-            if attacker_dist <= 1:
-                if unit.power <= u.power or unit.power < 20 or u.unit_type == "HEAVY":
-                    queue = power_recharge(unit, home_factory, player, opp_player, new_positions, game_state)
-                    evading = True
-                    return evading, queue
-                elif unit.power > u.power:
-                    if u.pos.tolist() not in o_facto:
-                        queue = move_toward(u.pos, unit, player, opp_player, new_positions, game_state, evading=True)
-                        evading = True
-                        return evading, queue
+def evade(unit, home_factory, player, opp_player, new_positions, distance_fields, game_state):
+    opp_units = game_state.unit_table(opp_player)
+    if len(opp_units) == 0:
+        return False, []
+    o_facto = np.array([op.pos for op in game_state.factories[opp_player].values()], dtype=int).reshape(-1, 2)
+    on_factory = (opp_units.pos[:, np.newaxis, :] == o_facto[np.newaxis, :, :]).all(2).any(1)
+    attacker_dist = opp_units.distances(unit.pos)
+    # the first opponent in table order that this unit has to react to decides what it does, like a loop would
+    if unit.type_code == HEAVY and unit.power >= 40:
+        threats = np.flatnonzero((attacker_dist < 2) & (opp_units.type_code == HEAVY) & ~on_factory)
+        if len(threats) > 0:
+            u = opp_units.unit(threats[0])
+            if unit.power <= u.power:
+                queue = retreat(unit, u, home_factory, game_state)
+            else:
+                queue = move_toward(u.pos, unit, player, opp_player, new_positions, game_state, evading=True)
+            return True, queue
+    elif unit.type_code == LIGHT:
+        stronger = (unit.power <= opp_units.power) | (unit.power < 20) | (opp_units.type_code == HEAVY)
+        threats = np.flatnonzero((attacker_dist <= 1) & (stronger | ~on_factory))
+        if len(threats) > 0:
+            if stronger[threats[0]]:
+                queue = power_recharge(unit, home_factory, player, opp_player, new_positions, distance_fields,
+                                       game_state)
+            else:
+                u = opp_units.unit(threats[0])
+                queue = move_toward(u.pos, unit, player, opp_player, new_positions, game_state, evading=True)
+            return True, queue
     return False, []
@@ -1,52 +1,120 @@
-from queue import PriorityQueue
-from typing import List, Tuple
+import heapq
 
+from lib.profiler import profiler
 
-def dijkstras_path(unit_type, rubble_map, start, finish, unit_positions):
-    start = tuple(start)
-    finish = tuple(finish)
-    unit_positions = [tuple(pos) for pos in unit_positions]
-    queue = PriorityQueue()
-    visited = set()
+'''
+Both searches take the flat list of what it costs a unit type to move onto each tile, the one DistanceFields keeps
+from the unit config (MOVE_COST + RUBBLE_MOVEMENT_COST * rubble), and that type's MOVE_COST, the cheapest any step
+can be and so what the heuristic counts per tile. Rubble on the finish tile is not charged.
+'''
+
+
+def dijkstras_path(move_costs, move_cost, start, finish, unit_positions, map_size=48):
+    """
+    A* search from start to finish. Returns the list of [x, y] positions from start to finish inclusive, or [] if
+    finish can't be reached.
+    """
+    n_rows = n_cols = map_size
+    step_costs = list(move_costs)
+
+    start = int(start[0]) * n_cols + int(start[1])
+    finish_x, finish_y = int(finish[0]), int(finish[1])
+    finish = finish_x * n_cols + finish_y
+    step_costs[finish] = move_cost
+    blocked = {int(pos[0]) * n_cols + int(pos[1]) for pos in unit_positions}
+    blocked.discard(start)
+
+    best = {start: 0}
     prev = {}
-    rubble_map[finish[0]][finish[1]] = 0
-    queue.put((0, start))
-    while not queue.empty():
-        cost, node = queue.get()
+    closed = set()
+    heap = [(move_cost * (abs(start // n_cols - finish_x) + abs(start % n_cols - finish_y)), 0, start)]
+    while heap:
+        _, neg_cost, node = heapq.heappop(heap)  # ties on f go to the deeper node
+        cost = -neg_cost
         if node == finish:
-            path = []
+            profiler.count("dijkstras_path_expansions", len(closed))
+            path = [[node // n_cols, node % n_cols]]
             while node != start:
-                path.append(list(node))
                 node = prev[node]
-            path.append(list(start))
+                path.append([node // n_cols, node % n_cols])
             return path[::-1]
-        if node in visited:
+        if node in closed:
             continue
-        visited.add(node)
-        for neighbor in get_neighbors(node, rubble_map):
-            if neighbor in unit_positions or neighbor in visited:
+        closed.add(node)
+
+        row, col = divmod(node, n_cols)
+        for neighbor, in_bounds in ((node - n_cols, row > 0), (node + n_cols, row < n_rows - 1),
+                                    (node - 1, col > 0), (node + 1, col < n_cols - 1)):
+            if not in_bounds or neighbor in blocked or neighbor in closed:
                 continue
-            # if unit_type == "HEAVY":
-            #     move_cost = 20
-            # else:
-            #     move_cost = 20
-            move_cost = 5
-            neighbor_cost = cost + move_cost + rubble_map[neighbor[0]][neighbor[1]]
-            queue.put((neighbor_cost, neighbor))
+            neighbor_cost = cost + step_costs[neighbor]
+            if neighbor_cost >= best.get(neighbor, neighbor_cost + 1):
+                continue
+            best[neighbor] = neighbor_cost
             prev[neighbor] = node
+            heuristic = move_cost * (abs(neighbor // n_cols - finish_x) + abs(neighbor % n_cols - finish_y))
+            heapq.heappush(heap, (neighbor_cost + heuristic, -neighbor_cost, neighbor))
+    profiler.count("dijkstras_path_expansions", len(closed))
     return []
 
 
-def get_neighbors(pos: Tuple[int, int], rubble_map: List[List[int]]) -> List[Tuple[int, int]]:
-    n_rows, n_cols = len(rubble_map), len(rubble_map[0])
-    row, col = pos
-    neighbors = []
-    if row > 0:
-        neighbors.append((row - 1, col))
-    if row < n_rows - 1:
-        neighbors.append((row + 1, col))
-    if col > 0:
-        neighbors.append((row, col - 1))
-    if col < n_cols - 1:
-        neighbors.append((row, col + 1))
-    return neighbors
+def cooperative_path(move_costs, move_cost, start, finish, reservations, owner, start_t=0):
+    """
+    Space-time A* against a ReservationTable. The unit may wait in place, so the returned list of [x, y]
+    positions holds one entry per turn starting at start_t and can repeat a position. Claims are only honoured
+    inside the reservation horizon, past that the search is a plain A* over the static blockers.
+    """
+    n_rows = n_cols = reservations.map_size
+    n_tiles = n_rows * n_cols
+    horizon = reservations.horizon
+    step_costs = list(move_costs)
+
+    start = int(start[0]) * n_cols + int(start[1])
+    finish_x, finish_y = int(finish[0]), int(finish[1])
+    finish = finish_x * n_cols + finish_y
+    step_costs[finish] = move_cost
+    static = reservations.static - {start}
+    claims = reservations.claims
+    if finish in static or claims.get(horizon * n_tiles + finish, owner) != owner:
+        return []
+
+    start_t = min(start_t, horizon)
+    best = {start_t * n_tiles + start: 0}
+    prev = {}
+    closed = set()
+    heap = [(move_cost * (abs(start // n_cols - finish_x) + abs(start % n_cols - finish_y)), 0, start_t, start)]
+    while heap:
+        _, neg_cost, t, node = heapq.heappop(heap)
+        cost = -neg_cost
+        state = t * n_tiles + node
+        if node == finish:
+            profiler.count("cooperative_path_expansions", len(closed))
+            path = [[node // n_cols, node % n_cols]]
+            while state in prev:
+                state = prev[state]
+                path.append([state % n_tiles // n_cols, state % n_tiles % n_cols])
+            return path[::-1]
+        if state in closed:
+            continue
+        closed.add(state)
+
+        next_t = t + 1 if t < horizon else horizon
+        row, col = divmod(node, n_cols)
+        for neighbor, in_bounds in ((node, t < horizon), (node - n_cols, row > 0), (node + n_cols, row < n_rows - 1),
+                                    (node - 1, col > 0), (node + 1, col < n_cols - 1)):
+            if not in_bounds or neighbor in static:
+                continue
+            neighbor_state = next_t * n_tiles + neighbor
+            if neighbor_state in closed:
+                continue
+            if t < horizon and claims.get(neighbor_state, owner) != owner:
+                continue
+            neighbor_cost = cost + (move_cost if neighbor == node else step_costs[neighbor])
+            if neighbor_cost >= best.get(neighbor_state, neighbor_cost + 1):
+                continue
+            best[neighbor_state] = neighbor_cost
+            prev[neighbor_state] = state
+            heuristic = move_cost * (abs(neighbor // n_cols - finish_x) + abs(neighbor % n_cols - finish_y))
+            heapq.heappush(heap, (neighbor_cost + heuristic, -neighbor_cost, next_t, neighbor))
+    profiler.count("cooperative_path_expansions", len(closed))
+    return []
@@ -0,0 +1,193 @@
+import heapq
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from lib.utils import get_factory_tiles
+
+'''
+DistanceFields holds, for each of our factories and each unit type, the power it costs to get home from every tile
+and the next tile to step onto. A field is computed the first time it is asked for and then kept up to date from the
+tiles whose rubble changed each turn, so a quiet turn costs next to nothing.
+'''
+
+UNIT_TYPES = ("LIGHT", "HEAVY")
+
+
+class DistanceFields:
+    def __init__(self, env_cfg):
+        self.env_cfg = env_cfg
+        self.map_size = env_cfg.map_size
+        n_tiles = self.map_size * self.map_size
+        tiles = np.arange(n_tiles).reshape(self.map_size, self.map_size)
+        # every ordered pair of orthogonally adjacent tiles, as flat indices. An edge a -> b stands for the move
+        # b -> a, so searching outward from a factory finds the cost of coming home.
+        self.edge_to = np.concatenate([tiles[1:, :].ravel(), tiles[:-1, :].ravel(),
+                                       tiles[:, 1:].ravel(), tiles[:, :-1].ravel()])
+        self.edge_from = np.concatenate([tiles[:-1, :].ravel(), tiles[1:, :].ravel(),
+                                         tiles[:, :-1].ravel(), tiles[:, 1:].ravel()])
+        self.neighbors = [[] for _ in range(n_tiles)]
+        for a, b in zip(self.edge_to.tolist(), self.edge_from.tolist()):
+            self.neighbors[a].append(b)
+        self.blocked = None
+        self.costs = dict()  # unit type -> power it costs to move onto each tile
+        self.graphs = dict()  # unit type -> sparse graph, rebuilt when the costs change
+        self.forward_graphs = dict()  # unit type -> the same graph with its edges pointing the way units move
+        self.fields = dict()  # (factory id, unit type) -> (distances, next hops)
+
+    def update(self, game_state, player, opp_player, rubble_changes=None):
+        """rubble_changes lists the tiles whose rubble changed since the last update, None means start over"""
+        blocked = game_state.layers.factory_mask(opp_player).ravel()
+
+        rubble = game_state.board.rubble.ravel()
+        if rubble_changes is None or self.blocked is None or (blocked != self.blocked).any():
+            self.blocked = blocked
+            self.costs = {unit_type: self.move_costs(unit_type, rubble).tolist() for unit_type in UNIT_TYPES}
+            self.graphs = dict()
+            self.forward_graphs = dict()
+            self.fields = dict()
+        elif len(rubble_changes) > 0:
+            changed = [int(x) * self.map_size + int(y) for x, y in rubble_changes]
+            for unit_type in UNIT_TYPES:
+                costs = self.costs[unit_type]
+                old_costs = [costs[tile] for tile in changed]
+                for tile, cost in zip(changed, self.move_costs(unit_type, rubble[changed]).tolist()):
+                    costs[tile] = cost
+                for (factory_id, field_type), field in self.fields.items():
+                    if field_type == unit_type:
+                        self.repair(field, costs, changed, old_costs)
+            self.graphs = dict()
+            self.forward_graphs = dict()
+
+        factory_ids = game_state.factories[player].keys()
+        self.fields = {key: field for key, field in self.fields.items() if key[0] in factory_ids}
+
+    def move_costs(self, unit_type, rubble):
+        unit_cfg = self.env_cfg.ROBOTS[unit_type]
+        return np.floor(unit_cfg.MOVE_COST + unit_cfg.RUBBLE_MOVEMENT_COST * rubble)
+
+    def move_cost(self, unit_type):
+        """the cost of a step onto a tile without rubble, the cheapest step there is"""
+        return self.env_cfg.ROBOTS[unit_type].MOVE_COST
+
+    def graph(self, unit_type):
+        if unit_type not in self.graphs:
+            open_edges = ~(self.blocked[self.edge_to] | self.blocked[self.edge_from])
+            edge_to = self.edge_to[open_edges]
+            edge_from = self.edge_from[open_edges]
+            weights = np.array(self.costs[unit_type])[edge_to]
+            n_tiles = self.map_size * self.map_size
+            self.graphs[unit_type] = csr_matrix((weights, (edge_to, edge_from)), shape=(n_tiles, n_tiles))
+        return self.graphs[unit_type]
+
+    def forward_graph(self, unit_type):
+        if unit_type not in self.forward_graphs:
+            self.forward_graphs[unit_type] = self.graph(unit_type).transpose().tocsr()
+        return self.forward_graphs[unit_type]
+
+    def field(self, factory, unit_type):
+        key = (factory.unit_id, unit_type)
+        if key not in self.fields:
+            sources = [x * self.map_size + y for x, y in get_factory_tiles([factory.pos])]
+            distances, next_hops, _ = dijkstra(self.graph(unit_type), directed=True, indices=sources, min_only=True,
+                                               return_predecessors=True)
+            # plain lists, the repairs and route lookups below index them one tile at a time
+            self.fields[key] = (distances.tolist(), next_hops.tolist())
+        return self.fields[key]
+
+    def repair(self, field, costs, changed, old_costs):
+        """
+        A tile that got cheaper can only shorten routes through it, so its neighbors are relaxed again. A tile that
+        got dearer invalidates every route through it, those tiles are reset and reconnected from the untouched
+        tiles around them. Either way only the affected tiles are searched again.
+        """
+        distances, next_hops = field
+        inf = float("inf")
+        blocked = self.blocked.tolist()
+        heap = []
+        orphans = []
+        for tile, old_cost in zip(changed, old_costs):
+            if costs[tile] > old_cost:
+                stack = [child for child in self.neighbors[tile] if next_hops[child] == tile]
+                while stack:
+                    node = stack.pop()
+                    distances[node] = inf
+                    next_hops[node] = -9999
+                    orphans.append(node)
+                    stack.extend(child for child in self.neighbors[node] if next_hops[child] == node)
+        for node in orphans:
+            for neighbor in self.neighbors[node]:
+                distance = distances[neighbor] + costs[neighbor]
+                if distance < distances[node]:
+                    distances[node] = distance
+                    next_hops[node] = neighbor
+            if distances[node] < inf:
+                heapq.heappush(heap, (distances[node], node))
+        for tile, old_cost in zip(changed, old_costs):
+            if costs[tile] < old_cost and distances[tile] < inf:
+                heapq.heappush(heap, (distances[tile], tile))
+
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            distance += costs[node]
+            for neighbor in self.neighbors[node]:
+                if distance < distances[neighbor] and not blocked[neighbor]:
+                    distances[neighbor] = distance
+                    next_hops[neighbor] = node
+                    heapq.heappush(heap, (distance, neighbor))
+
+    def cost_to_reach(self, targets, unit_type) -> np.ndarray:
+        """flat array of the power it costs to get from every tile onto the closest of the (n, 2) target tiles"""
+        sources = [int(x) * self.map_size + int(y) for x, y in targets]
+        return dijkstra(self.graph(unit_type), directed=True, indices=sources, min_only=True)
+
+    def paths_from(self, positions, unit_type):
+        """
+        One csgraph call out of all (n, 2) positions: the (n, w * h) power it costs to get from each position onto
+        every tile and the (n, w * h) predecessors trace() turns into paths.
+        """
+        sources = [int(x) * self.map_size + int(y) for x, y in positions]
+        return dijkstra(self.forward_graph(unit_type), directed=True, indices=sources, return_predecessors=True)
+
+    def trace(self, distances, predecessors, pos) -> list:
+        """positions from the source of a paths_from row to pos, inclusive. [] if pos can't be reached"""
+        tile = int(pos[0]) * self.map_size + int(pos[1])
+        if distances[tile] == np.inf:
+            return []
+        path = [[tile // self.map_size, tile % self.map_size]]
+        while predecessors[tile] >= 0:
+            tile = int(predecessors[tile])
+            path.append([tile // self.map_size, tile % self.map_size])
+        return path[::-1]
+
+    def distance(self, factory, unit_type, pos) -> float:
+        distances, _ = self.field(factory, unit_type)
+        return distances[int(pos[0]) * self.map_size + int(pos[1])]
+
+    def route(self, factory, unit_type, pos) -> list:
+        """positions from pos to the cheapest tile of the factory, inclusive. [] if the factory can't be reached"""
+        distances, next_hops = self.field(factory, unit_type)
+        tile = int(pos[0]) * self.map_size + int(pos[1])
+        if distances[tile] == float("inf"):
+            return []
+        path = [[tile // self.map_size, tile % self.map_size]]
+        while next_hops[tile] >= 0:
+            tile = int(next_hops[tile])
+            path.append([tile // self.map_size, tile % self.map_size])
+        return path
+
+    def next_step(self, factory, unit_type, pos):
+        """the tile to move onto to head home, the factory center if there is no route"""
+        _, next_hops = self.field(factory, unit_type)
+        tile = next_hops[int(pos[0]) * self.map_size + int(pos[1])]
+        if tile < 0:
+            return factory.pos
+        return np.array([tile // self.map_size, tile % self.map_size])
+
+    def closest_factory(self, factories, unit):
+        factory_units = [f for u, f in factories.items()]
+        factory_distances = [self.distance(f, unit.unit_type, unit.pos) for f in factory_units]
+        return factory_units[int(np.argmin(factory_distances))]
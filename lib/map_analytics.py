@@ -0,0 +1,69 @@
+import numpy as np
+
+from lib.placement import low_rubble_scores, nearest_resource_distances
+from lib.profiler import profiler
+
+'''
+MapAnalytics is everything we work out from the map alone. It's built during the bidding turn, which has time to
+spare, so the placement turns only have to mask the candidate ranking with the spawns that are still valid.
+'''
+
+ICE_WEIGHTS = np.array([1, 0, 0, 0])  # weight of the distance to the 1st..4th closest ice
+ORE_WEIGHTS = np.array([0, 0, 0, 0])
+ICE_PREFERENCE = 7  # if you want to make ore more important, change to 0.3 for example
+RESOURCE_SCORE_WEIGHT = 7  # how much closeness to resources counts against the low rubble region score
+SHORTLIST_SIZE = 10  # best spawns by the cheap score that get their real travel costs worked out
+
+
+class MapAnalytics:
+    def __init__(self, board):
+        self.resource_distances = {resource: nearest_resource_distances(board[resource], k=4)
+                                   for resource in ("ice", "ore")}
+        self.low_rubble_scores = low_rubble_scores(board["rubble"], threshold=25, radius=8, decay=0.9)
+
+        weighted_ice_dist = np.sum(self.resource_distances["ice"] * ICE_WEIGHTS[:, np.newaxis, np.newaxis], axis=0)
+        weighted_ore_dist = np.sum(self.resource_distances["ore"] * ORE_WEIGHTS[:, np.newaxis, np.newaxis], axis=0)
+        combined_score = weighted_ice_dist * ICE_PREFERENCE + weighted_ore_dist
+        self.spawn_scores = self.low_rubble_scores + (np.max(combined_score) - combined_score) * RESOURCE_SCORE_WEIGHT
+        # every tile, best spawn score first, ties in row-major order like np.argmax
+        self.spawn_ranking = np.argsort(-self.spawn_scores.ravel(), kind="stable")
+        self.resource_tiles = {resource: np.argwhere(board[resource] == 1) for resource in ("ice", "ore")}
+
+    def best_spawn(self, valid_spawns_mask, distance_fields=None):
+        """
+        The highest scoring tile that is still a valid spawn. Given the distance fields, the best SHORTLIST_SIZE
+        spawns by the manhattan distance score are ranked again by what it really costs a heavy to get from the
+        factory onto the resources, rubble included.
+        """
+        with profiler.phase("spawn_shortlist"):
+            valid = valid_spawns_mask.ravel()[self.spawn_ranking].astype(bool)
+            candidates = self.spawn_ranking[valid][:SHORTLIST_SIZE]
+        if len(candidates) == 0:  # nothing valid left, this is what np.argmax over the masked score gave
+            return np.unravel_index(self.spawn_ranking[0], self.spawn_scores.shape)
+        if distance_fields is None or len(candidates) == 1:
+            return np.unravel_index(candidates[0], self.spawn_scores.shape)
+        with profiler.phase("spawn_rerank"):
+            best = self.rerank(candidates, distance_fields)
+        return np.unravel_index(best, self.spawn_scores.shape)
+
+    def rerank(self, candidates, distance_fields):
+        """the candidate with the best score once the manhattan distances are swapped for real travel costs"""
+        profiler.count("spawn_candidates", len(candidates))
+        x, y = np.unravel_index(candidates, self.spawn_scores.shape)
+        # the 3x3 tiles of a factory placed on each candidate, as flat indices, one row per candidate
+        footprint = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        tiles_x = np.clip(x[:, np.newaxis] + footprint[:, 0], 0, self.spawn_scores.shape[0] - 1)
+        tiles_y = np.clip(y[:, np.newaxis] + footprint[:, 1], 0, self.spawn_scores.shape[1] - 1)
+        tiles = tiles_x * self.spawn_scores.shape[1] + tiles_y
+        move_cost = distance_fields.env_cfg.ROBOTS["HEAVY"].MOVE_COST
+        combined_score = np.zeros(len(candidates))
+        for resource, weight in (("ice", ICE_WEIGHTS[0] * ICE_PREFERENCE), ("ore", ORE_WEIGHTS[0])):
+            if weight == 0 or len(self.resource_tiles[resource]) == 0:
+                continue
+            costs = distance_fields.cost_to_reach(self.resource_tiles[resource], "HEAVY")
+            # in tiles, so the score keeps the scale of the manhattan distances it replaces
+            combined_score += weight * costs[tiles].min(axis=1) / move_cost
+        scores = self.low_rubble_scores.ravel()[candidates] - combined_score * RESOURCE_SCORE_WEIGHT
+        if not np.isfinite(scores).any():  # no candidate reaches any resource, keep the cheap ranking
+            return candidates[0]
+        return candidates[np.argmax(scores)]
@@ -0,0 +1,99 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from lux.unit import LIGHT, HEAVY
+
+'''
+MinerAssignment matches all of our idle miners to resource tiles in one solve per turn, so two units never head for
+the same tile. Heavies are matched to ice and "miner" lights to ore. The cost of a tile for a unit is the power it
+takes to get there from where the unit stands plus the power to get from the tile back to its home factory, the
+first from one batched search out of every miner's position, the second read off the distance fields. The same
+search hands each matched unit its path, build_mining_queue tries that before searching on its own. A unit that
+mines something it wasn't matched for falls back to get_target_tile.
+'''
+
+CANDIDATES_PER_FACTORY = 6  # free tiles closest to each home factory that go into the cost matrix
+UNREACHABLE_COST = 1e6  # stands in for inf, linear_sum_assignment needs finite costs
+MINER_TYPES = {"ice": HEAVY, "ore": LIGHT}
+MINER_TITLES = {"ice": ("homer", "sentry"), "ore": ("miner",)}  # heavy_actions mines ice whatever the heavy's title
+
+
+class MinerAssignment:
+    def __init__(self, agent):
+        self.agent = agent
+        self.assignments = dict()  # resource -> unit id -> (tile, path onto it)
+
+    def reset(self):
+        self.assignments = dict()
+
+    def tile_for(self, resource, unit, game_state):
+        """
+        The tile the unit was matched to this turn and the path onto it from the solve's batched search, (None, [])
+        if it has none or the tile got taken since.
+        """
+        if resource not in self.assignments:
+            self.assignments[resource] = self.solve(resource, game_state)
+        tile, path = self.assignments[resource].get(unit.unit_id, (None, []))
+        if tile is None or self.agent.new_positions.is_taken(tile):
+            return None, []
+        reservations = self.agent.reservations
+        if not reservations.is_free(tile, reservations.horizon, unit.unit_id):
+            return None, []
+        return tile, path
+
+    def solve(self, resource, game_state) -> dict:
+        agent = self.agent
+        factories = game_state.factories[agent.player]
+        if len(factories) == 0:
+            return dict()
+        homes = {uid: fid for fid, uids in agent.inventory.factory_units.items() for uid in uids}
+        titles = agent.inventory.unit_title
+        miners = [u for uid, u in game_state.units[agent.player].items()
+                  if u.type_code == MINER_TYPES[resource] and titles.get(uid) in MINER_TITLES[resource]
+                  and len(agent.prev_actions.get(uid, [])) == 0]
+        if len(miners) == 0:
+            return dict()
+        home_factories = []
+        for unit in miners:
+            home_id = homes.get(unit.unit_id)
+            if home_id in factories:
+                home_factories.append(factories[home_id])
+            else:  # new this turn, the agent will hand it to the closest factory
+                home_factories.append(agent.distance_fields.closest_factory(factories, unit))
+
+        taken = agent.new_positions.mask()
+        # a path can't end on a tile another unit holds at the end of the reservation window
+        taken |= agent.reservations.claimed_mask(agent.reservations.horizon, exclude={u.unit_id for u in miners})
+        if MINER_TYPES[resource] == LIGHT:  # lights stay off tiles other units stand on, like get_target_tile
+            others = game_state.layers.occupancy(agent.player).copy()
+            for unit in miners:
+                others[unit.pos[0], unit.pos[1]] = False
+            taken |= others
+        resources = game_state.resources
+        tiles = resources.tiles[resource]
+        candidates = []
+        for factory in {f.unit_id: f for f in home_factories}.values():
+            order = resources.order(resource, factory.pos)
+            free = order[~taken[tiles[order, 0], tiles[order, 1]]]
+            candidates.extend(free[:CANDIDATES_PER_FACTORY].tolist())
+        candidates = sorted(set(candidates))
+        if len(candidates) == 0:
+            return dict()
+
+        distance_fields = agent.distance_fields
+        unit_type = miners[0].unit_type
+        candidate_tiles = tiles[candidates]
+        flat_tiles = candidate_tiles[:, 0] * distance_fields.map_size + candidate_tiles[:, 1]
+        distances, predecessors = distance_fields.paths_from([unit.pos for unit in miners], unit_type)
+        costs = distances[:, flat_tiles]
+        for row, factory in enumerate(home_factories):
+            costs[row] += [distance_fields.distance(factory, unit_type, tile) for tile in candidate_tiles]
+        costs[~np.isfinite(costs)] = UNREACHABLE_COST
+        rows, cols = linear_sum_assignment(costs)
+        matches = dict()
+        for row, col in zip(rows, cols):
+            if costs[row, col] < UNREACHABLE_COST:
+                tile = tiles[candidates[col]]
+                path = distance_fields.trace(distances[row], predecessors[row], tile)
+                matches[miners[row].unit_id] = (tile, path)
+        return matches
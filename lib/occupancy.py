@@ -0,0 +1,40 @@
+import numpy as np
+
+'''
+OccupancyGrid counts the claims on every tile for the coming turn: factory centers, opponent factory tiles and the
+tile each of our units is about to move onto. A tile can be claimed more than once (a unit heading onto a factory
+center), so releasing a claim only drops one of them. Claims off the map are ignored.
+'''
+
+
+class OccupancyGrid:
+    def __init__(self, map_size=48):
+        self.map_size = map_size
+        self.claims = np.zeros((map_size, map_size), dtype=int)
+
+    def reset(self, positions=()):
+        self.claims[:] = 0
+        for pos in positions:
+            self.claim(pos)
+
+    def on_map(self, pos) -> bool:
+        return 0 <= pos[0] < self.map_size and 0 <= pos[1] < self.map_size
+
+    def claim(self, pos):
+        if self.on_map(pos):
+            self.claims[pos[0], pos[1]] += 1
+
+    def release(self, pos):
+        if self.on_map(pos) and self.claims[pos[0], pos[1]] > 0:
+            self.claims[pos[0], pos[1]] -= 1
+
+    def is_taken(self, pos) -> bool:
+        return self.on_map(pos) and self.claims[pos[0], pos[1]] > 0
+
+    def mask(self) -> np.ndarray:
+        """bool board of the claimed tiles"""
+        return self.claims > 0
+
+    def positions(self) -> np.ndarray:
+        """(n, 2) positions of the claimed tiles"""
+        return np.argwhere(self.claims > 0)
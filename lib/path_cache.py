@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from lib.dijkstra import cooperative_path, dijkstras_path
+
+'''
+PathCache keeps the most recently used static A* paths. A path is dropped as soon as the rubble on any tile it
+crosses changes, and a path planned around a different set of blockers is a different entry.
+'''
+
+
+class PathCache:
+    def __init__(self, map_size=48, max_size=512):
+        self.map_size = map_size
+        self.max_size = max_size
+        self.paths = OrderedDict()  # (start, finish, unit type, blocker signature) -> path, least recently used first
+        self.keys_on_tile = dict()  # flat tile -> keys of the cached paths crossing it
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def static_path(self, unit_type, distance_fields, start, finish, blockers, signature):
+        key = (int(start[0]), int(start[1]), int(finish[0]), int(finish[1]), unit_type, signature)
+        if key in self.paths:
+            self.hits += 1
+            self.paths.move_to_end(key)
+            return self.paths[key]
+        self.misses += 1
+        path = dijkstras_path(distance_fields.costs[unit_type], distance_fields.move_cost(unit_type), start, finish,
+                              blockers, self.map_size)
+        self.paths[key] = path
+        for pos in path:
+            self.keys_on_tile.setdefault(pos[0] * self.map_size + pos[1], set()).add(key)
+        if len(self.paths) > self.max_size:
+            self.forget(next(iter(self.paths)))
+        return path
+
+    def forget(self, key):
+        for pos in self.paths.pop(key):
+            tile = pos[0] * self.map_size + pos[1]
+            self.keys_on_tile[tile].discard(key)
+            if len(self.keys_on_tile[tile]) == 0:
+                del self.keys_on_tile[tile]
+
+    def invalidate(self, rubble_changes):
+        for x, y in rubble_changes:
+            for key in list(self.keys_on_tile.get(int(x) * self.map_size + int(y), ())):
+                if key in self.paths:
+                    self.forget(key)
+                    self.invalidations += 1
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, invalidations=self.invalidations, size=len(self.paths))
+
+
+def planned_path(unit_type, distance_fields, start, finish, reservations, owner, path_cache, start_t=0,
+                 static_path=None):
+    """
+    The static path (static_path if given, e.g. from a batched search, else the cached one) when following it doesn't
+    run into anyone's reservation, otherwise a cooperative search. Either way the positions are one per turn starting
+    at start_t. The cooperative search can't end on a finish someone else holds at the end of the reservation window,
+    targets are chosen among the tiles that are free then (ReservationTable.claimed_mask).
+    """
+    path = static_path
+    if path is None:
+        path = path_cache.static_path(unit_type, distance_fields, start, finish, reservations.static_positions(),
+                                      reservations.signature)
+    if len(path) > 0 and reservations.is_free(finish, reservations.horizon, owner):
+        if all(reservations.is_free(pos, start_t + i, owner) for i, pos in enumerate(path) if i > 0):
+            return path
+    return cooperative_path(distance_fields.costs[unit_type], distance_fields.move_cost(unit_type), start, finish,
+                            reservations, owner, start_t=start_t)
@@ -1,30 +1,29 @@
-from lib.utils import direction_to, next_position, find_new_direction
+from lib.utils import direction_to, next_position, find_new_direction, other_units_mask
+from lux.unit import LIGHT
 
 
 def move_toward(target_tile, unit, player, opp_player, new_positions, game_state, evading=False) -> list:
-    unit_positions = [u.pos for u in game_state.units[player].values() if u.unit_id != unit.unit_id]
-    unit_positions.extend(new_positions)
+    blocked = other_units_mask(unit, player, game_state) | new_positions.mask()
 
     direction = direction_to(unit.pos, target_tile)
     if not evading:
-        unit_positions.extend([u.pos for u in game_state.units[opp_player].values()])
+        blocked |= game_state.layers.occupancy(opp_player)
     next_pos = next_position(unit, direction)
-    for u in unit_positions:
-        if next_pos[0] == u[0] and next_pos[1] == u[1]:
-            new_direction = find_new_direction(unit, unit_positions, game_state)
-            if unit.move_cost(game_state, direction) is not None and unit.action_queue_cost(game_state) is not None:
-                cost = unit.move_cost(game_state, direction) + unit.action_queue_cost(game_state)
-            elif unit.unit_type == "LIGHT":
-                cost = 8
-            else:
-                cost = 30
-            if unit.power >= cost:
-                return [unit.move(new_direction, repeat=0)]
-            else:
-                return [unit.recharge(x=cost)]
+    if new_positions.on_map(next_pos) and blocked[next_pos[0], next_pos[1]]:
+        new_direction = find_new_direction(unit, blocked, game_state)
+        if unit.move_cost(game_state, direction) is not None and unit.action_queue_cost(game_state) is not None:
+            cost = unit.move_cost(game_state, direction) + unit.action_queue_cost(game_state)
+        elif unit.type_code == LIGHT:
+            cost = 8
+        else:
+            cost = 30
+        if unit.power >= cost:
+            return [unit.move(new_direction, repeat=0)]
+        else:
+            return [unit.recharge(x=cost)]
     if unit.move_cost(game_state, direction) is not None and unit.action_queue_cost(game_state) is not None:
         cost = unit.move_cost(game_state, direction) + unit.action_queue_cost(game_state)
-    elif unit.unit_type == "LIGHT":
+    elif unit.type_code == LIGHT:
         cost = 8
     else:
         cost = 30
@@ -55,3 +54,11 @@ def path_to(unit, start, finish) -> list:
         for i in range(abs(x)):
             path.append(unit.move(2, repeat=0))
     return path
+
+
+def positions_to_queue(unit, path_positions) -> list:
+    """one move per step of a path of positions, staying on the same tile becomes a move to center"""
+    queue = []
+    for i in range(len(path_positions) - 1):
+        queue.append(unit.move(direction_to(path_positions[i], path_positions[i + 1]), repeat=0))
+    return queue
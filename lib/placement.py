@@ -0,0 +1,52 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.spatial import KDTree
+
+'''
+Analytics for choosing where to place factories. Everything here only depends on the map, so it's computed once per
+game and only combined with the valid spawns mask on the placement turns.
+'''
+
+
+def low_rubble_scores(rubble, threshold=25, radius=8, decay=0.9) -> np.ndarray:
+    """
+    For every tile, the low rubble tiles (rubble < threshold) that can be reached from it without leaving low rubble
+    or going more than radius tiles away, each weighted by decay ** its distance. Tiles that aren't low rubble score
+    0. All tiles are flood filled at once, one window around each tile, instead of one search per tile.
+    """
+    low_rubble = rubble < threshold
+    size = 2 * radius + 1
+    padded = np.pad(low_rubble, radius, constant_values=False)
+    offsets = np.abs(np.arange(size) - radius)
+    distances = offsets[:, np.newaxis] + offsets[np.newaxis, :]
+    # windows[i, j] is the square around tile (i, j), cut down to the diamond of tiles within radius of it
+    windows = sliding_window_view(padded, (size, size)).reshape(-1, size, size) & (distances <= radius)
+
+    reached = np.zeros_like(windows)
+    reached[:, radius, radius] = windows[:, radius, radius]
+    active = np.flatnonzero(reached[:, radius, radius])  # windows whose fill is still growing
+    while len(active) > 0:
+        current = reached[active]
+        grown = current.copy()
+        grown[:, 1:, :] |= current[:, :-1, :]
+        grown[:, :-1, :] |= current[:, 1:, :]
+        grown[:, :, 1:] |= current[:, :, :-1]
+        grown[:, :, :-1] |= current[:, :, 1:]
+        grown &= windows[active]
+        changed = (grown != current).any(axis=(1, 2))
+        reached[active] = grown
+        active = active[changed]
+
+    weights = decay ** distances
+    return (reached * weights).sum(axis=(1, 2)).reshape(rubble.shape)
+
+
+def nearest_resource_distances(resource, k=4) -> np.ndarray:
+    """
+    (k, w, h) manhattan distances from every tile to its closest, second closest, ... k-th closest resource tile,
+    out of one tree and one query. inf where the map has fewer than n resource tiles.
+    """
+    tree = KDTree(np.argwhere(resource == 1))
+    tiles = np.argwhere(np.ones(resource.shape, dtype=bool))
+    distances, _ = tree.query(tiles, k=k, p=1)
+    return distances.reshape(resource.shape + (k,)).transpose(2, 0, 1)
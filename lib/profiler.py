@@ -0,0 +1,86 @@
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+'''
+Profiler times the phases of a turn and counts calls on the hot paths. It's off unless the LUX_PROFILE environment
+variable is set: "stderr" or "1" writes one JSON line per turn to stderr, anything else is the path of a file the
+lines are appended to. After the last turn (or when the process exits early) one summary line per player with the
+p50 and p99 of every phase follows. While it's off every hook returns right away.
+'''
+
+
+class Profiler:
+    def __init__(self, target=None):
+        self.enabled = bool(target)
+        self.target = target
+        self.player = None
+        self.step = None
+        self.turn_started = time.perf_counter()
+        self.phases = dict()  # phase -> seconds spent in it this turn
+        self.counts = dict()  # counter -> count this turn
+        self.history = dict()  # player -> phase -> milliseconds of every turn
+        self.summarized = False
+        if self.enabled:
+            atexit.register(self.summary)
+
+    def start_turn(self, player, step):
+        if not self.enabled:
+            return
+        self.player, self.step = player, step
+        self.phases, self.counts = dict(), dict()
+        self.turn_started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """times the block, a phase entered more than once in a turn (once per unit) is summed"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def end_turn(self, **extra):
+        """writes the turn's line, extra goes into it as is"""
+        if not self.enabled:
+            return
+        phases = {name: seconds * 1000 for name, seconds in self.phases.items()}
+        phases["turn"] = (time.perf_counter() - self.turn_started) * 1000
+        player_history = self.history.setdefault(self.player, dict())
+        for name, ms in phases.items():
+            player_history.setdefault(name, []).append(ms)
+        self.write(dict(player=self.player, step=self.step, phases={k: round(v, 3) for k, v in phases.items()},
+                        counts=self.counts, **extra))
+
+    def summary(self):
+        if not self.enabled or self.summarized:
+            return
+        self.summarized = True
+        for player, phases in self.history.items():
+            self.write(dict(player=player, summary={
+                name: dict(turns=len(ms), p50=round(float(np.percentile(ms, 50)), 3),
+                           p99=round(float(np.percentile(ms, 99)), 3))
+                for name, ms in phases.items()}))
+
+    def write(self, record):
+        line = json.dumps(record)
+        if self.target in ("stderr", "1"):
+            print(line, file=sys.stderr)
+        else:
+            with open(self.target, "a") as f:
+                f.write(line + "\n")
+
+
+profiler = Profiler(os.environ.get("LUX_PROFILE"))
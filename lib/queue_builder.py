@@ -3,8 +3,10 @@ import numpy as np
 
 from lib.actions import dig_rubble
 from lib.dijkstra import dijkstras_path
-from lib.pathing import path_to
-from lib.utils import get_target_tile, factory_adjacent, get_factory_tiles, direction_to
+from lib.path_cache import planned_path
+from lib.pathing import positions_to_queue
+from lib.utils import compress_queue, get_target_tile, factory_adjacent, get_factory_tiles, direction_to
+from lux.unit import LIGHT, HEAVY
 
 
 class Queue:
@@ -15,7 +17,11 @@ class Queue:
         queue = []
         path = []
         pickup_amt = 0
-        mining_tile = get_target_tile(resource, unit, self.agent.player, self.agent.new_positions, game_state, obs, start=home_f.pos)
+        mining_tile, static_path = self.agent.miner_assignment.tile_for(resource, unit, game_state)
+        if mining_tile is None:
+            static_path = None
+            mining_tile = get_target_tile(resource, unit, self.agent.player, self.agent.new_positions, game_state, obs,
+                                          start=home_f.pos, reservations=self.agent.reservations)
 
         tile_locations = get_factory_tiles([home_f.pos])
         tile_distances = np.mean((tile_locations - mining_tile) ** 2, 1)
@@ -29,15 +35,17 @@ class Queue:
         else:
             res_type = 1
             cargo = unit.cargo.ore
+        free_cargo = unit.unit_cfg.CARGO_SPACE - unit.cargo.ice - unit.cargo.ore
         if cargo > 0 and adjacent_to_factory:
             direction = direction_to(unit.pos, factory_tile)
             transfer = unit.transfer(direction, res_type, cargo, n=1)
             queue.append(transfer)
+            free_cargo += cargo
 
         if game_state.real_env_steps > 10 and on_factory:
-            if unit.unit_type == "LIGHT" and unit.power < 100:
+            if unit.type_code == LIGHT and unit.power < 100:
                 pickup_amt = 150 - unit.power
-            elif unit.unit_type == "HEAVY":
+            elif unit.type_code == HEAVY:
                 if home_f.power < 1000:
                     pickup_amt = (home_f.power - 50)
                 elif home_f.power < 3000:
@@ -48,38 +56,31 @@ class Queue:
                 pickup = unit.pickup(4, pickup_amt, n=1)
                 queue.append(pickup)
 
-        rubble_map = game_state.board.rubble
-        unit_positions = [u.pos for u in game_state.units[self.agent.player].values() if u.unit_id != unit.unit_id]
-        unit_positions.extend(self.agent.new_positions)
+        distance_fields = self.agent.distance_fields
+        reservations = self.agent.reservations
+        unit_positions = np.concatenate([game_state.unit_table(self.agent.player).positions(exclude=unit.unit_id),
+                                         self.agent.new_positions.positions()])
         if unit.pos[0] != mining_tile[0] or unit.pos[1] != mining_tile[1]:
-            path = []
-            path_positions = dijkstras_path(unit.unit_type, rubble_map, unit.pos, mining_tile, unit_positions)
-            # print(
-            #     f"Step {game_state.real_env_steps}: {unit.unit_id} is following this path to the mining tile {path_positions}",
-            #     file=sys.stderr)
-            for i, pos in enumerate(path_positions):
-                if i + 1 < len(path_positions):
-                    path.append(path_to(unit, path_positions[i], path_positions[i + 1]))
-            path = [act[0] for act in path]
+            path_positions = planned_path(unit.unit_type, distance_fields, unit.pos, mining_tile, reservations,
+                                          unit.unit_id, self.agent.path_cache, start_t=len(queue),
+                                          static_path=static_path)
+            path = positions_to_queue(unit, path_positions)
             if len(path) > 0:
                 queue.extend(path)
             else:
                 queue = dig_rubble(unit, self.agent.player, self.agent.opp_player, self.agent.new_positions, game_state, obs)
                 return queue
 
-        path_back = []
-        path_back_positions = dijkstras_path(unit.unit_type, rubble_map, mining_tile, factory_tile,
-                                             unit_positions)
-        # print(
-        #     f"Step {game_state.real_env_steps}: {unit.unit_id} is following this path back {path_back_positions}",
-        #     file=sys.stderr)
-
-        for i, pos in enumerate(path_back_positions):
-            if i + 1 < len(path_back_positions):
-                path_back.append(path_to(unit, path_back_positions[i], path_back_positions[i + 1]))
-        path_back = [act[0] for act in path_back]
+        path_back_positions = distance_fields.route(home_f, unit.unit_type, mining_tile)
+        if len(path_back_positions) > 0:
+            factory_tile = path_back_positions[-1]
+        else:
+            path_back_positions = dijkstras_path(distance_fields.costs[unit.unit_type],
+                                                 distance_fields.move_cost(unit.unit_type), mining_tile, factory_tile,
+                                                 unit_positions, distance_fields.map_size)
+        path_back = positions_to_queue(unit, path_back_positions)
 
-        if unit.unit_type == "LIGHT":
+        if unit.type_code == LIGHT:
             path_cost = 0
             step = game_state.real_env_steps
             for i in range(len(path) + len(path_back)):
@@ -92,23 +93,22 @@ class Queue:
 
         num_digs = ((unit.power - unit.action_queue_cost(game_state) - path_cost + (pickup_amt // 2)) // (
             unit.dig_cost(game_state)))
+        # runs of digs and moves are merged into single actions, so the queue no longer caps the digs, cargo does
+        if num_digs > free_cargo // unit.unit_cfg.DIG_RESOURCE_GAIN:
+            num_digs = free_cargo // unit.unit_cfg.DIG_RESOURCE_GAIN
         if num_digs > 0:
-            if num_digs > 20 - len(queue):
-                num_digs = 20 - len(queue)
-            for i in range(num_digs):
-                queue.append(unit.dig(n=1))
+            queue.append(unit.dig(n=num_digs))
 
-        if len(queue) > 20 - len(path_back):
-            path_back_steps = 20 - len(queue)
-            if path_back_steps > 0:
-                path_back = path_back[:path_back_steps]
-            else:
-                path_back = []
-        queue.extend(path_back)
-        if len(queue) > 20:  # just in case
-            queue = queue[:20]
+        turns_before_back = sum(int(act[5]) for act in queue)
+        if turns_before_back < reservations.horizon and len(path_back) > 0:
+            # the way back starts inside the reservation window, so plan it around everyone else's queues
+            cooperative_back = planned_path(unit.unit_type, distance_fields, mining_tile, factory_tile, reservations,
+                                            unit.unit_id, self.agent.path_cache, start_t=turns_before_back)
+            if len(cooperative_back) > 0:
+                path_back = positions_to_queue(unit, cooperative_back)
 
-        return queue
+        queue.extend(path_back)
+        return compress_queue(queue)[:self.agent.env_cfg.UNIT_ACTION_QUEUE_SIZE]
 
     def build_transfer_queue(self):
         pass
\ No newline at end of file
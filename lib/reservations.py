@@ -0,0 +1,92 @@
+import numpy as np
+
+from lux.unit import move_deltas
+
+'''
+ReservationTable holds the tile each of our units will be on for each of the next `horizon` turns
+'''
+
+
+class ReservationTable:
+    def __init__(self, map_size=48, horizon=20):
+        self.map_size = map_size
+        self.horizon = horizon  # UNIT_ACTION_QUEUE_SIZE, nothing is planned further ahead than this
+        self.claims = dict()  # t * map_size**2 + flat tile -> owner
+        self.owned = dict()  # owner -> keys it holds in self.claims
+        self.static = set()  # flat tiles that are blocked every turn (factories)
+        self.signature = hash(frozenset(self.static))  # tells cached paths planned around other blockers apart
+
+    def reset(self):
+        self.claims = dict()
+        self.owned = dict()
+        self.static = set()
+        self.signature = hash(frozenset(self.static))
+
+    def key(self, pos, t):
+        return t * self.map_size * self.map_size + int(pos[0]) * self.map_size + int(pos[1])
+
+    def block(self, positions):
+        for pos in positions:
+            self.static.add(int(pos[0]) * self.map_size + int(pos[1]))
+        self.signature = hash(frozenset(self.static))
+
+    def static_positions(self):
+        return [divmod(tile, self.map_size) for tile in self.static]
+
+    def is_free(self, pos, t, owner=None):
+        flat = int(pos[0]) * self.map_size + int(pos[1])
+        if flat in self.static:
+            return False
+        if t > self.horizon:
+            return True
+        claimant = self.claims.get(t * self.map_size * self.map_size + flat)
+        return claimant is None or claimant == owner
+
+    def claimed_mask(self, t, exclude=()) -> np.ndarray:
+        """bool board of the tiles claimed at turn t by anyone but the owners in exclude"""
+        n_tiles = self.map_size * self.map_size
+        first = t * n_tiles
+        mask = np.zeros(n_tiles, dtype=bool)
+        for key, owner in self.claims.items():
+            if first <= key < first + n_tiles and owner not in exclude:
+                mask[key - first] = True
+        return mask.reshape(self.map_size, self.map_size)
+
+    def reserve(self, owner, positions, start_t=1):
+        """claims positions[i] at turn start_t + i, the last position is held until the end of the horizon"""
+        self.release(owner)
+        if len(positions) == 0:
+            return
+        keys = []
+        for t in range(start_t, self.horizon + 1):
+            pos = positions[min(t - start_t, len(positions) - 1)]
+            key = self.key(pos, t)
+            if key not in self.claims:
+                self.claims[key] = owner
+                keys.append(key)
+        self.owned[owner] = keys
+
+    def reserve_queue(self, owner, pos, queue):
+        self.reserve(owner, queue_positions(pos, queue, self.horizon))
+
+    def release(self, owner):
+        for key in self.owned.pop(owner, []):
+            if self.claims.get(key) == owner:
+                del self.claims[key]
+
+
+def queue_positions(pos, queue, horizon=20):
+    """positions a unit at pos will occupy after each of the next turns if it follows its action queue"""
+    x, y = int(pos[0]), int(pos[1])
+    positions = []
+    for act in queue:
+        for i in range(max(int(act[5]), 1)):
+            if act[0] == 0:  # it's a move command
+                x += int(move_deltas[act[1]][0])
+                y += int(move_deltas[act[1]][1])
+            positions.append((x, y))
+            if len(positions) >= horizon:
+                return positions
+    if len(positions) == 0:
+        positions.append((x, y))
+    return positions
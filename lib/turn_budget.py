@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from lux.unit import HEAVY
+
+'''
+TurnBudget decides how long a turn may take and in which order our units get planned. Heavies and units with an
+opponent next to them come first and are always planned in full. Once the turn has used most of its budget the
+remaining units fall back to something cheap, so a late game turn with many units can't run into the timeout.
+The budget is the part of the act timeout we are happy to use plus an even share of the overage time that's left.
+'''
+
+TURN_TIME = 2.0  # seconds of the 3 second act timeout a turn may use without dipping into the overage time
+OVERAGE_RESERVE = 10  # seconds of overage time that are never handed out, for turns that run long anyway
+FALLBACK_AT = 0.8  # share of the budget after which low priority units fall back
+
+
+class TurnBudget:
+    def __init__(self, max_episode_length=1000):
+        self.max_episode_length = max_episode_length
+        self.started = time.perf_counter()
+        self.budget = TURN_TIME  # seconds this turn may take
+        self.fallbacks = 0  # units that fell back this turn
+
+    def start(self, real_env_steps, remaining_overage_time):
+        self.started = time.perf_counter()
+        turns_left = max(self.max_episode_length - real_env_steps, 1)
+        self.budget = TURN_TIME + max(remaining_overage_time - OVERAGE_RESERVE, 0) / turns_left
+        self.fallbacks = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def running_low(self) -> bool:
+        return self.elapsed() > self.budget * FALLBACK_AT
+
+    def order(self, units, opp_units) -> list:
+        """
+        (unit id, urgent) for each of our units in the order they should be planned: heavies and units an opponent
+        could hit next turn first, every group in the order of the UnitTable units.
+        """
+        if len(units) == 0:
+            return []
+        threatened = np.zeros(len(units), dtype=bool)
+        if len(opp_units) > 0:
+            distances = np.abs(units.pos[:, np.newaxis, :] - opp_units.pos[np.newaxis, :, :]).sum(2)
+            threatened = distances.min(1) <= 1
+        urgent = threatened | (units.type_code == HEAVY)
+        return [(units.ids[row], bool(urgent[row])) for row in np.argsort(~urgent, kind="stable")]
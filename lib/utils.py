@@ -1,4 +1,3 @@
-from copy import deepcopy
 import random
 import sys
 
@@ -6,6 +5,9 @@ import numpy as np
 from scipy.ndimage import distance_transform_cdt
 from scipy.spatial import KDTree
 
+from lib.profiler import profiler
+from lux.unit import LIGHT
+
 
 def my_turn_to_place_factory(place_first: bool, step: int):
     if place_first:
@@ -60,57 +62,69 @@ def next_position(unit, direction):
         print(f"Error: invalid direction in next_position {direction}", file=sys.stderr)
 
 
-def find_new_direction(unit, unit_positions, game_state) -> int:
+def compress_queue(queue) -> list:
+    """merges runs of identical actions into a single action whose n is the length of the run"""
+    compressed = []
+    for act in queue:
+        if len(compressed) > 0 and np.array_equal(compressed[-1][:5], act[:5]):
+            compressed[-1][5] += act[5]
+        else:
+            compressed.append(np.array(act))  # copied because n gets added to in place
+    return compressed
+
+
+def find_new_direction(unit, blocked, game_state) -> int:
+    """blocked is a bool board of the tiles to stay off"""
     r = list(range(1, 5))
     random.shuffle(r)
     for d in r:
         new_pos = next_position(unit, d)
-        in_unit_positions = False
-        for pos in unit_positions:
-            if new_pos[0] == pos[0] and new_pos[1] == pos[1]:
-                in_unit_positions = True
-                break
-        if in_unit_positions:
-            continue
-        if 0 <= new_pos[0] < 48 and 0 <= new_pos[1] < 48:
+        if 0 <= new_pos[0] < 48 and 0 <= new_pos[1] < 48 and not blocked[new_pos[0], new_pos[1]]:
             return d
     return 0
 
 
+def other_units_mask(unit, player, game_state) -> np.ndarray:
+    """bool board of the tiles the player's units stand on, leaving out the tile of unit itself"""
+    profiler.count("board_copies")
+    mask = game_state.layers.occupancy(player).copy()
+    if getattr(unit, "unit_id", None) in game_state.unit_table(player).rows:
+        mask[unit.pos[0], unit.pos[1]] = False
+    return mask
+
+
 def closest_type_tile(tile_type: str, unit_or_homef, player, opponent, game_state, obs, heavy=False,
                       this_is_the_unit=None) -> np.ndarray:
-    all_units = game_state.units[player]
+    all_units = game_state.unit_table(player)
     if this_is_the_unit is not None:
-        unit_positions = [u.pos for u in all_units.values() if u.unit_id != this_is_the_unit.unit_id]
+        unit_positions = list(all_units.positions(exclude=this_is_the_unit.unit_id))
     else:
-        unit_positions = [u.pos for u in all_units.values() if u.unit_id != unit_or_homef.unit_id]
+        unit_positions = list(all_units.positions(exclude=getattr(unit_or_homef, "unit_id", None)))
 
     if heavy is False:
-        unit_positions.extend([u.pos for u in game_state.units[opponent].values()])
+        unit_positions.extend(game_state.unit_table(opponent).pos)
 
-    o_facto = [u.pos for u in game_state.factories[opponent].values()]
-    opp_factories = get_factory_tiles(o_facto)
-    unit_positions.extend(opp_factories)
-    type_tiles = obs["board"][tile_type]
+    unit_positions.extend(game_state.layers.factory_tiles(opponent))
     if tile_type != "rubble":
-        tile_locations = np.argwhere(type_tiles == 1)
-        tile_distances = np.mean((tile_locations - unit_or_homef.pos) ** 2, 1)
+        tile_locations = game_state.resources.tiles[tile_type]
+        tile_distances = game_state.resources.distances(tile_type, unit_or_homef.pos)
         if heavy is False:
             unit_positions.extend([tile_locations[np.argmin(tile_distances)]])
         target_tile = tile_locations[np.argmin(tile_distances)]
     else:
+        rubble_index = game_state.rubble_index
         if heavy is True:
-            tile_locations = np.argwhere(game_state.board.rubble > 0)
+            tile_locations = rubble_index.tiles(2)
             tile_distances = np.mean((tile_locations - unit_or_homef.pos) ** 2, 1)
             target_tile = tile_locations[np.argmin(tile_distances)]
         else:
-            tile_locations = np.argwhere(((game_state.board.rubble <= 40) & (game_state.board.rubble > 0)))
+            tile_locations = rubble_index.tiles(0)
             tile_distances = np.mean((tile_locations - unit_or_homef.pos) ** 2, 1)
             if 20 < np.min(tile_distances) < 50:
-                tile_locations = np.argwhere((game_state.board.rubble <= 60) & (game_state.board.rubble > 0))
+                tile_locations = rubble_index.tiles(1)
                 tile_distances = np.mean((tile_locations - unit_or_homef.pos) ** 2, 1)
             elif np.min(tile_distances) >= 50:
-                tile_locations = np.argwhere(game_state.board.rubble > 0)
+                tile_locations = rubble_index.tiles(2)
                 tile_distances = np.mean((tile_locations - unit_or_homef.pos) ** 2, 1)
             target_tile = tile_locations[np.argmin(tile_distances)]
 
@@ -128,19 +142,17 @@ def closest_type_tile(tile_type: str, unit_or_homef, player, opponent, game_stat
     return target_tile
 
 
-def get_target_tile(resource, unit, player, new_positions, game_state, obs, start=None):
-    """Finds the closest tile to the unit that is not occupied by a unit or a factory"""
-    player_units = game_state.units[player]
-    unit_positions = []
-    if unit.unit_type == "LIGHT":  # this is so the heavy doesn't try to avoid light units that might be on their ice tile
-        unit_positions = [u.pos for uid, u in player_units.items() if uid != unit.unit_id]
-    unit_positions.extend(new_positions)
-
-    type_tiles = deepcopy(obs["board"][resource])
-    for pos in unit_positions:
-        x = int(pos[0])
-        y = int(pos[1])
-        type_tiles[x, y] = 0
+def get_target_tile(resource, unit, player, new_positions, game_state, obs, start=None, reservations=None):
+    """
+    Finds the closest tile to the unit that is not occupied by a unit or a factory. Given the reservations, tiles
+    another unit holds at the end of the reservation window are taken too, a path can't end on those.
+    """
+    profiler.count("get_target_tile")
+    taken = new_positions.mask()
+    if reservations is not None:
+        taken |= reservations.claimed_mask(reservations.horizon, exclude=(unit.unit_id,))
+    if unit.type_code == LIGHT:  # this is so the heavy doesn't try to avoid light units that might be on their ice tile
+        taken |= other_units_mask(unit, player, game_state)
 
     if start is not None:
         start_pos = start
@@ -148,34 +160,35 @@ def get_target_tile(resource, unit, player, new_positions, game_state, obs, star
         start_pos = unit.pos
 
     if resource == "rubble":
-        tile_locations = np.argwhere(((type_tiles <= 40) & (type_tiles > 0)))
-        tile_distances = np.mean((tile_locations - start_pos) ** 2, 1)
-        if 20 < np.min(tile_distances) < 50:
-            tile_locations = np.argwhere((type_tiles <= 60) & (type_tiles > 0))
-            tile_distances = np.mean((tile_locations - start_pos) ** 2, 1)
-        elif np.min(tile_distances) >= 50:
-            tile_locations = np.argwhere(type_tiles > 0)
-            tile_distances = np.mean((tile_locations - start_pos) ** 2, 1)
-        target_tile = tile_locations[np.argmin(tile_distances)]
+        rubble_index = game_state.rubble_index
+        target_tile, distance = rubble_index.nearest(start_pos, 0, taken)
+        if 20 < distance < 50:
+            target_tile, distance = rubble_index.nearest(start_pos, 1, taken)
+        elif distance >= 50:
+            target_tile, distance = rubble_index.nearest(start_pos, 2, taken)
     else:
-        tile_locations = np.argwhere(type_tiles == 1)
-        tile_distances = np.mean((tile_locations - start_pos) ** 2, 1)
-        target_tile = tile_locations[np.argmin(tile_distances)]
+        target_tile = game_state.resources.closest(resource, start_pos, taken)
 
     return target_tile
 
 
 def closest_opp_lichen(opp_strains, unit, player, new_positions, game_state, obs):
-    all_units = game_state.units[player]
-    unit_positions = [u.pos for u in all_units.values() if u.unit_id != unit.unit_id]
-    unit_positions.extend(new_positions)
-    lichen_tiles = deepcopy(obs["board"]["lichen_strains"])
-    for pos in unit_positions:
-        x = int(pos[0])
-        y = int(pos[1])
-        lichen_tiles[x, y] = 1000  # this is a null value for the lichen strains
-    tile_locations = np.argwhere(np.isin(lichen_tiles, opp_strains))
-    tile_distances = [distance_to(unit.pos, tile) for tile in tile_locations]
+    """the closest opponent lichen no other unit stands on or is heading for, None if there is none"""
+    nearest_lichen = game_state.layers.nearest_lichen(opp_strains)
+    if nearest_lichen is None:
+        return None
+    blocked = other_units_mask(unit, player, game_state) | new_positions.mask()
+    _, nearest = nearest_lichen
+    target_tile = nearest[:, unit.pos[0], unit.pos[1]]
+    if not blocked[target_tile[0], target_tile[1]]:
+        return np.array(target_tile)
+
+    # the closest lichen is taken, look further among the free ones
+    opp_lichen = game_state.layers.lichen_mask(opp_strains) & ~blocked
+    tile_locations = np.argwhere(opp_lichen)
+    if len(tile_locations) == 0:
+        return None
+    tile_distances = np.abs(tile_locations - unit.pos).sum(1)
     target_tile = tile_locations[np.argmin(tile_distances)]
     return np.array(target_tile)
 
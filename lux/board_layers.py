@@ -0,0 +1,79 @@
+import numpy as np
+from scipy.ndimage import distance_transform_cdt
+
+'''
+BoardLayers computes the masks and counts derived from one step's board the first time they are asked for and keeps
+them until the next step, so e.g. every unit looking for opponent lichen shares one np.isin over the board.
+Layers are shared, copy one before changing it.
+'''
+
+
+class BoardLayers:
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.cache = dict()
+
+    def lichen_mask(self, strains) -> np.ndarray:
+        """bool board of the tiles holding lichen of any of the given strains"""
+        key = ("lichen_mask", tuple(sorted(strains)))
+        if key not in self.cache:
+            self.cache[key] = np.isin(self.game_state.board.lichen_strains, list(strains))
+        return self.cache[key]
+
+    def lichen_tiles(self, strains) -> np.ndarray:
+        """(n, 2) positions of the lichen of the given strains"""
+        key = ("lichen_tiles", tuple(sorted(strains)))
+        if key not in self.cache:
+            self.cache[key] = np.argwhere(self.lichen_mask(strains))
+        return self.cache[key]
+
+    def nearest_lichen(self, strains):
+        """
+        For every tile the manhattan distance to the closest lichen of the given strains and, as a (2, w, h) array,
+        the position of that lichen. None when there is no such lichen.
+        """
+        key = ("nearest_lichen", tuple(sorted(strains)))
+        if key not in self.cache:
+            mask = self.lichen_mask(strains)
+            if not mask.any():
+                self.cache[key] = None
+            else:
+                self.cache[key] = distance_transform_cdt(~mask, metric="taxicab", return_indices=True)
+        return self.cache[key]
+
+    def strain_counts(self) -> np.ndarray:
+        """number of lichen tiles of every strain, indexed by strain id + 1 so that -1 (no lichen) is 0"""
+        if "strain_counts" not in self.cache:
+            self.cache["strain_counts"] = np.bincount(self.game_state.board.lichen_strains.ravel() + 1)
+        return self.cache["strain_counts"]
+
+    def strain_count(self, strain_id) -> int:
+        counts = self.strain_counts()
+        return int(counts[strain_id + 1]) if strain_id + 1 < len(counts) else 0
+
+    def factory_mask(self, agent) -> np.ndarray:
+        """bool board of the 3x3 tiles covered by the agent's factories"""
+        key = ("factory_mask", agent)
+        if key not in self.cache:
+            mask = np.zeros(self.game_state.board.rubble.shape, dtype=bool)
+            for factory in self.game_state.factories.get(agent, dict()).values():
+                mask[factory.pos_slice] = True
+            self.cache[key] = mask
+        return self.cache[key]
+
+    def factory_tiles(self, agent) -> np.ndarray:
+        """(n, 2) positions of the tiles covered by the agent's factories"""
+        key = ("factory_tiles", agent)
+        if key not in self.cache:
+            self.cache[key] = np.argwhere(self.factory_mask(agent))
+        return self.cache[key]
+
+    def occupancy(self, agent) -> np.ndarray:
+        """bool board of the tiles the agent's units stand on"""
+        key = ("occupancy", agent)
+        if key not in self.cache:
+            mask = np.zeros(self.game_state.board.rubble.shape, dtype=bool)
+            positions = self.game_state.unit_table(agent).pos
+            mask[positions[:, 0], positions[:, 1]] = True
+            self.cache[key] = mask
+        return self.cache[key]
@@ -1,8 +1,17 @@
-from dataclasses import dataclass
-
-@dataclass
 class UnitCargo:
-    ice: int = 0
-    ore: int = 0
-    water: int = 0
-    metal: int = 0
+    """a plain slotted class rather than a dataclass, the defaults would clash with __slots__"""
+    __slots__ = ("ice", "ore", "water", "metal")
+
+    def __init__(self, ice: int = 0, ore: int = 0, water: int = 0, metal: int = 0):
+        self.ice = ice
+        self.ore = ore
+        self.water = water
+        self.metal = metal
+
+    def __repr__(self):
+        return f"UnitCargo(ice={self.ice}, ore={self.ore}, water={self.water}, metal={self.metal})"
+
+    def __eq__(self, other):
+        if not isinstance(other, UnitCargo):
+            return NotImplemented
+        return (self.ice, self.ore, self.water, self.metal) == (other.ice, other.ore, other.water, other.metal)
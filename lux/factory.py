@@ -8,6 +8,7 @@ from lux.config import EnvConfig
 
 @dataclass
 class Factory:
+    __slots__ = ("team_id", "unit_id", "strain_id", "power", "cargo", "pos", "env_cfg")
     team_id: int
     unit_id: str
     strain_id: int
@@ -52,7 +53,7 @@ class Factory:
         """
         Water required to perform water action
         """
-        owned_lichen_tiles = (game_state.board.lichen_strains == self.strain_id).sum()
+        owned_lichen_tiles = game_state.layers.strain_count(self.strain_id)
         return np.ceil(owned_lichen_tiles / self.env_cfg.LICHEN_WATERING_COST_FACTOR)
 
     def can_water(self, game_state):
@@ -1,15 +1,31 @@
 from dataclasses import dataclass, field
-from typing import Dict
+from typing import Dict, List
 import numpy as np
 from lux.cargo import UnitCargo
 from lux.config import EnvConfig
 from lux.team import Team, FactionTypes
 from lux.unit import Unit
 from lux.factory import Factory
+from lux.unit_table import UnitTable
+from lux.board_layers import BoardLayers
+from lux.resource_index import ResourceIndex
+from lux.rubble_index import RubbleIndex
 
 
 def process_action(action):
-    return to_json(action)
+    """
+    Serializes an actions dict in one pass. Factory actions are ints and unit actions are lists of action arrays,
+    anything else (the setup bids and spawns) goes through to_json.
+    """
+    out = dict()
+    for unit_id, acts in action.items():
+        if isinstance(acts, (int, np.integer)):
+            out[unit_id] = int(acts)
+        elif isinstance(acts, list):
+            out[unit_id] = [act.tolist() for act in acts]
+        else:
+            out[unit_id] = to_json(acts)
+    return out
 
 
 def to_json(obj):
@@ -43,26 +59,52 @@ def from_json(state):
 
 
 def process_obs(player, game_state, step, obs):
+    """
+    Turns the parsed JSON observation into the dict the agent works with. Only the fields that are used as arrays
+    are converted, one np.asarray per board layer and per position, instead of a from_json walk over everything.
+    The parsed observation is converted in place.
+    """
+    entities_from_json(obs)
     if step == 0:
         # at step 0 we get the entire map information
-        game_state = from_json(obs)
+        game_state = obs
+        game_state["board"] = {k: np.asarray(v) if isinstance(v, list) else v for k, v in obs["board"].items()}
     else:
         # use delta changes to board to update game state
-        obs = from_json(obs)
         for k in obs:
             if k != 'board':
                 game_state[k] = obs[k]
             else:
                 if "valid_spawns_mask" in obs[k]:
-                    game_state["board"]["valid_spawns_mask"] = obs[k]["valid_spawns_mask"]
+                    game_state["board"]["valid_spawns_mask"] = np.asarray(obs[k]["valid_spawns_mask"])
+        # the tiles of each layer that changed this step as an (n, 2) array of [x, y], for anything that keeps
+        # state derived from the board
         for item in ["rubble", "lichen", "lichen_strains"]:
-            for k, v in obs["board"][item].items():
-                k = k.split(",")
-                x, y = int(k[0]), int(k[1])
-                game_state["board"][item][x, y] = v
+            changes, values = delta_indices(obs["board"][item])
+            game_state["board"][item][changes[:, 0], changes[:, 1]] = values
+            game_state["board"][item + "_changes"] = changes
     return game_state
 
 
+def entities_from_json(obs):
+    """the positions and action queues of units and factories as arrays, everything else stays as parsed"""
+    for units in obs["units"].values():
+        for unit_data in units.values():
+            unit_data["pos"] = np.asarray(unit_data["pos"])
+            unit_data["action_queue"] = np.asarray(unit_data["action_queue"])
+    for factories in obs["factories"].values():
+        for f_data in factories.values():
+            f_data["pos"] = np.asarray(f_data["pos"])
+
+
+def delta_indices(delta):
+    """parses the "x,y" keys of a board delta in one go, returns the (n, 2) tile array and the new values"""
+    if len(delta) == 0:
+        return np.zeros((0, 2), dtype=int), np.zeros(0, dtype=int)
+    changes = np.array(",".join(delta.keys()).split(","), dtype=int).reshape(-1, 2)
+    return changes, np.fromiter(delta.values(), dtype=int, count=len(delta))
+
+
 def obs_to_game_state(step, env_cfg: EnvConfig, obs):
     units = dict()
     for agent in obs["units"]:
@@ -118,6 +160,111 @@ def obs_to_game_state(step, env_cfg: EnvConfig, obs):
     )
 
 
+def update_game_state(game_state, step, env_cfg: EnvConfig, obs):
+    """
+    Brings the GameState of an earlier step up to date in place instead of building a new one. Units and factories
+    are matched by id, and the ids that appeared or disappeared since the last update are recorded on the game state.
+    """
+    if game_state is None:
+        game_state = obs_to_game_state(step, env_cfg, obs)
+        for agent in game_state.units:
+            game_state.added_units[agent] = list(game_state.units[agent].keys())
+            game_state.removed_units[agent] = []
+        for agent in game_state.factories:
+            game_state.added_factories[agent] = list(game_state.factories[agent].keys())
+            game_state.removed_factories[agent] = []
+        return game_state
+
+    game_state.env_steps = step
+    game_state.unit_tables = dict()
+    game_state.layers = BoardLayers(game_state)
+    board = game_state.board
+    board.rubble = obs["board"]["rubble"]
+    if obs["board"].get("rubble_changes") is None:
+        game_state.rubble_index = RubbleIndex(board.rubble)
+    else:
+        game_state.rubble_index.update(board.rubble, obs["board"]["rubble_changes"])
+    board.lichen = obs["board"]["lichen"]
+    board.lichen_strains = obs["board"]["lichen_strains"]
+    board.factories_per_team = obs["board"]["factories_per_team"]
+    board.valid_spawns_mask = obs["board"]["valid_spawns_mask"]
+
+    for agent in obs["units"]:
+        units = game_state.units.setdefault(agent, dict())
+        game_state.added_units[agent] = []
+        for unit_id, unit_data in obs["units"][agent].items():
+            unit = units.get(unit_id)
+            if unit is None:
+                cargo = UnitCargo(**unit_data["cargo"])
+                unit = Unit(
+                    **unit_data,
+                    unit_cfg=env_cfg.ROBOTS[unit_data["unit_type"]],
+                    env_cfg=env_cfg
+                )
+                unit.cargo = cargo
+                units[unit_id] = unit
+                game_state.added_units[agent].append(unit_id)
+            else:
+                unit.pos = unit_data["pos"]
+                unit.power = unit_data["power"]
+                unit.action_queue = unit_data["action_queue"]
+                update_cargo(unit.cargo, unit_data["cargo"])
+        game_state.removed_units[agent] = [unit_id for unit_id in units if unit_id not in obs["units"][agent]]
+        for unit_id in game_state.removed_units[agent]:
+            del units[unit_id]
+
+    factories_changed = False
+    for agent in obs["factories"]:
+        factories = game_state.factories.setdefault(agent, dict())
+        game_state.added_factories[agent] = []
+        for unit_id, f_data in obs["factories"][agent].items():
+            factory = factories.get(unit_id)
+            if factory is None:
+                cargo = UnitCargo(**f_data["cargo"])
+                factory = Factory(
+                    **f_data,
+                    env_cfg=env_cfg
+                )
+                factory.cargo = cargo
+                factories[unit_id] = factory
+                game_state.added_factories[agent].append(unit_id)
+            else:
+                factory.power = f_data["power"]
+                update_cargo(factory.cargo, f_data["cargo"])
+        game_state.removed_factories[agent] = [unit_id for unit_id in factories
+                                               if unit_id not in obs["factories"][agent]]
+        for unit_id in game_state.removed_factories[agent]:
+            del factories[unit_id]
+        if len(game_state.added_factories[agent]) > 0 or len(game_state.removed_factories[agent]) > 0:
+            factories_changed = True
+    if factories_changed:
+        factory_occupancy_map = np.ones_like(obs["board"]["rubble"], dtype=int) * -1
+        for agent in game_state.factories:
+            for factory in game_state.factories[agent].values():
+                factory_occupancy_map[factory.pos_slice] = factory.strain_id
+        board.factory_occupancy_map = factory_occupancy_map
+
+    for agent in obs["teams"]:
+        team_data = obs["teams"][agent]
+        if agent not in game_state.teams:
+            game_state.teams[agent] = Team(**team_data, agent=agent)
+        else:
+            team = game_state.teams[agent]
+            team.water = team_data["water"]
+            team.metal = team_data["metal"]
+            team.factories_to_place = team_data["factories_to_place"]
+            team.factory_strains = team_data["factory_strains"]
+            team.place_first = team_data["place_first"]
+    return game_state
+
+
+def update_cargo(cargo: UnitCargo, cargo_data):
+    cargo.ice = cargo_data["ice"]
+    cargo.ore = cargo_data["ore"]
+    cargo.water = cargo_data["water"]
+    cargo.metal = cargo_data["metal"]
+
+
 @dataclass
 class Board:
     rubble: np.ndarray
@@ -141,6 +288,29 @@ class GameState:
     units: Dict[str, Dict[str, Unit]] = field(default_factory=dict)
     factories: Dict[str, Dict[str, Factory]] = field(default_factory=dict)
     teams: Dict[str, Team] = field(default_factory=dict)
+    # ids that appeared or disappeared since the previous update_game_state, per agent
+    added_units: Dict[str, List[str]] = field(default_factory=dict)
+    removed_units: Dict[str, List[str]] = field(default_factory=dict)
+    added_factories: Dict[str, List[str]] = field(default_factory=dict)
+    removed_factories: Dict[str, List[str]] = field(default_factory=dict)
+    # columnar views of the units, built the first time they are asked for in a step
+    unit_tables: Dict[str, UnitTable] = field(default_factory=dict)
+    # masks and counts derived from the board, computed the first time they are asked for in a step
+    layers: BoardLayers = field(init=False, repr=False)
+    # ice and ore tiles, indexed once since they never change
+    resources: ResourceIndex = field(init=False, repr=False)
+    # rubble tiles by tier, kept up to date from the rubble deltas
+    rubble_index: RubbleIndex = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.layers = BoardLayers(self)
+        self.resources = ResourceIndex(self.board.ice, self.board.ore)
+        self.rubble_index = RubbleIndex(self.board.rubble)
+
+    def unit_table(self, agent) -> UnitTable:
+        if agent not in self.unit_tables:
+            self.unit_tables[agent] = UnitTable(self.units.get(agent, dict()))
+        return self.unit_tables[agent]
 
     @property
     def real_env_steps(self):
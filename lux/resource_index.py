@@ -0,0 +1,43 @@
+import numpy as np
+
+'''
+ResourceIndex holds the ice and ore tiles, which never change after step 0. For each position it's asked about it
+keeps the tiles sorted by distance, so finding the closest free tile is a walk down a cached list rather than a new
+argwhere over the board.
+'''
+
+RESOURCES = ("ice", "ore")
+
+
+class ResourceIndex:
+    def __init__(self, ice, ore):
+        # tiles in row-major order, the same order np.argwhere gives
+        self.tiles = {"ice": np.argwhere(ice == 1), "ore": np.argwhere(ore == 1)}
+        self.distance_cache = dict()  # (resource, x, y) -> squared distances to every tile
+        self.order_cache = dict()  # (resource, x, y) -> tile indices sorted by distance
+
+    def distances(self, resource, pos) -> np.ndarray:
+        """half the squared euclidean distance from pos to every tile, the measure the rest of the bot uses"""
+        key = (resource, int(pos[0]), int(pos[1]))
+        if key not in self.distance_cache:
+            distances = np.mean((self.tiles[resource] - np.asarray(pos)) ** 2, 1)
+            distances.flags.writeable = False  # shared between callers
+            self.distance_cache[key] = distances
+        return self.distance_cache[key]
+
+    def order(self, resource, pos) -> np.ndarray:
+        key = (resource, int(pos[0]), int(pos[1]))
+        if key not in self.order_cache:
+            # stable, so ties keep the row-major order and go to the same tile np.argmin would pick
+            self.order_cache[key] = np.argsort(self.distances(resource, pos), kind="stable")
+        return self.order_cache[key]
+
+    def closest(self, resource, pos, taken=None) -> np.ndarray:
+        """the closest tile to pos that isn't marked in the bool board taken"""
+        tiles = self.tiles[resource]
+        order = self.order(resource, pos)
+        if taken is not None:
+            free = order[~taken[tiles[order, 0], tiles[order, 1]]]
+            if len(free) > 0:
+                return tiles[free[0]]
+        return tiles[order[0]]
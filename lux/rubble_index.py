@@ -0,0 +1,66 @@
+import numpy as np
+
+'''
+RubbleIndex keeps the rubble tiles sorted into the tiers the diggers pick their targets from (up to 40, up to 60,
+anything more) and moves tiles between tiers from each step's rubble deltas, so finding a target never scans the
+whole board.
+'''
+
+TIER_LIMITS = (40, 60)  # highest rubble of every tier but the last, which takes the rest
+
+
+class RubbleIndex:
+    def __init__(self, rubble):
+        self.map_size = rubble.shape[1]
+        self.tier = np.full(rubble.size, -1, dtype=np.int8)  # tier of each flat tile, -1 without rubble
+        self.buckets = [set() for _ in range(len(TIER_LIMITS) + 1)]  # tier -> flat tiles in it
+        self.tile_cache = dict()  # max tier -> (n, 2) tiles of all tiers up to it, row-major order
+        flat_rubble = rubble.ravel()
+        for tile in np.flatnonzero(flat_rubble > 0).tolist():
+            self.place(tile, flat_rubble[tile])
+
+    def tier_of(self, rubble) -> int:
+        if rubble <= 0:
+            return -1
+        for tier, limit in enumerate(TIER_LIMITS):
+            if rubble <= limit:
+                return tier
+        return len(TIER_LIMITS)
+
+    def place(self, tile, rubble):
+        old_tier, new_tier = self.tier[tile], self.tier_of(rubble)
+        if old_tier == new_tier:
+            return
+        if old_tier >= 0:
+            self.buckets[old_tier].discard(tile)
+        if new_tier >= 0:
+            self.buckets[new_tier].add(tile)
+        self.tier[tile] = new_tier
+        self.tile_cache = dict()
+
+    def update(self, rubble, rubble_changes):
+        """rubble_changes is the (n, 2) array of tiles whose rubble changed this step"""
+        for x, y in rubble_changes:
+            self.place(int(x) * self.map_size + int(y), rubble[x, y])
+
+    def tiles(self, max_tier) -> np.ndarray:
+        """(n, 2) positions of every rubble tile in tiers 0 to max_tier, in the order np.argwhere would give them"""
+        if max_tier not in self.tile_cache:
+            flat = sorted(tile for tier in range(max_tier + 1) for tile in self.buckets[tier])
+            flat = np.array(flat, dtype=int)
+            self.tile_cache[max_tier] = np.stack([flat // self.map_size, flat % self.map_size], axis=1)
+        return self.tile_cache[max_tier]
+
+    def nearest(self, pos, max_tier, taken=None):
+        """
+        The tile in tiers 0 to max_tier closest to pos and half its squared distance, the measure the digger
+        targeting uses, skipping tiles marked in the bool board taken. (None, inf) if there is none.
+        """
+        tiles = self.tiles(max_tier)
+        if taken is not None:
+            tiles = tiles[~taken[tiles[:, 0], tiles[:, 1]]]
+        if len(tiles) == 0:
+            return None, float("inf")
+        distances = np.mean((tiles - np.asarray(pos)) ** 2, 1)
+        best = int(np.argmin(distances))
+        return tiles[best], float(distances[best])
@@ -11,9 +11,30 @@ from lux.config import EnvConfig
 # a[1] = direction (0 = center, 1 = up, 2 = right, 3 = down, 4 = left)
 move_deltas = np.array([[0, 0], [0, -1], [1, 0], [0, 1], [-1, 0]])
 
+# unit types as small ints, comparing these is cheaper than comparing the strings
+UNIT_TYPE_CODES = {"LIGHT": 0, "HEAVY": 1}
+LIGHT, HEAVY = UNIT_TYPE_CODES["LIGHT"], UNIT_TYPE_CODES["HEAVY"]
+
+# actions without a resource or an amount (move, dig, self destruct) only differ in direction, repeat and n, so each
+# one is built once and shared. They are read only, copy one before changing it.
+action_table = dict()
+
+
+def interned_action(action_type, direction=0, repeat=0, n=1):
+    key = (action_type, direction, repeat, n)
+    action = action_table.get(key)
+    if action is None:
+        action = np.array([action_type, direction, 0, 0, repeat, n])
+        action.flags.writeable = False
+        action_table[key] = action
+    return action
+
 
 @dataclass
 class Unit:
+    # no per-instance __dict__, a unit is only ever these fields
+    __slots__ = ("team_id", "unit_id", "unit_type", "pos", "power", "cargo", "env_cfg", "unit_cfg", "action_queue",
+                 "type_code")
     team_id: int
     unit_id: str
     unit_type: str  # "LIGHT" or "HEAVY"
@@ -24,13 +45,16 @@ class Unit:
     unit_cfg: dict
     action_queue: List
 
+    def __post_init__(self):  # type_code is a slot but not a field, it always follows unit_type
+        self.type_code = UNIT_TYPE_CODES[self.unit_type]
+
     @property
     def agent_id(self):
         if self.team_id == 0: return "player_0"
         return "player_1"
 
     def action_queue_cost(self, game_state):
-        cost = self.env_cfg.ROBOTS[self.unit_type].ACTION_QUEUE_POWER_COST
+        cost = self.unit_cfg.ACTION_QUEUE_POWER_COST
         return cost
 
     def move_cost(self, game_state, direction):
@@ -53,7 +77,7 @@ class Unit:
             direction = direction
         else:
             pass
-        return np.array([0, direction, 0, 0, repeat, n])
+        return interned_action(0, direction, repeat, n)
 
     def transfer(self, transfer_direction, transfer_resource, transfer_amount, repeat=0, n=1):
         # 0 = ice, 1 = ore, 2 = water, 3 = metal, 4 power
@@ -69,13 +93,13 @@ class Unit:
         return self.unit_cfg.DIG_COST
 
     def dig(self, repeat=0, n=1):
-        return np.array([3, 0, 0, 0, repeat, n])
+        return interned_action(3, 0, repeat, n)
 
     def self_destruct_cost(self, game_state):
         return self.unit_cfg.SELF_DESTRUCT_COST
 
     def self_destruct(self, repeat=0, n=1):
-        return np.array([4, 0, 0, 0, repeat, n])
+        return interned_action(4, 0, repeat, n)
 
     def recharge(self, x, repeat=0, n=1):
         return np.array([5, 0, 0, x, repeat, n])
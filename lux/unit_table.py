@@ -0,0 +1,34 @@
+import numpy as np
+
+'''
+UnitTable holds one team's units column by column, so questions about all of them at once (who is next to this
+tile, who threatens this unit) are a single array operation instead of a loop over Unit objects.
+Row i of every column describes self.units[i], the Unit objects stay the source of truth.
+'''
+
+
+class UnitTable:
+    def __init__(self, units: dict):
+        self.units = list(units.values())
+        self.ids = list(units.keys())
+        self.rows = {unit_id: row for row, unit_id in enumerate(self.ids)}
+        n_units = len(self.units)
+        self.pos = np.array([u.pos for u in self.units], dtype=int).reshape(n_units, 2)
+        self.power = np.array([u.power for u in self.units], dtype=int)
+        self.type_code = np.array([u.type_code for u in self.units], dtype=np.int8)
+
+    def __len__(self):
+        return len(self.units)
+
+    def unit(self, row):
+        return self.units[row]
+
+    def positions(self, exclude=None) -> np.ndarray:
+        """(n, 2) positions of every unit but the one with id exclude"""
+        if exclude is None or exclude not in self.rows:
+            return self.pos
+        return np.delete(self.pos, self.rows[exclude], axis=0)
+
+    def distances(self, pos) -> np.ndarray:
+        """manhattan distance from pos to every unit"""
+        return np.abs(self.pos - np.asarray(pos, dtype=int)).sum(1)
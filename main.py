@@ -5,8 +5,20 @@ from argparse import Namespace
 
 from agent import Agent
 from lux.config import EnvConfig
+from lib.profiler import profiler
 from lux.kit import GameState, process_obs, to_json, from_json, process_action, obs_to_game_state
 
+try:  # orjson parses the full step 0 boards several times faster, the standard library is the fallback
+    import orjson
+
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    loads = json.loads
+    dumps = json.dumps
+
 ### DO NOT REMOVE THE FOLLOWING CODE ###
 agent_dict = dict()  # store potentially multiple dictionaries as kaggle imports code directly
 agent_prev_obs = dict()
@@ -27,7 +39,11 @@ def agent_fn(observation, configurations):
         agent_prev_obs[player] = dict()
         agent = agent_dict[player]
     agent = agent_dict[player]
-    obs = process_obs(player, agent_prev_obs[player], step, json.loads(observation.obs))
+    profiler.start_turn(player, step)
+    # the stdin loop below hands over the already parsed dict, kaggle hands over the raw string
+    raw_obs = observation.obs if isinstance(observation.obs, dict) else loads(observation.obs)
+    with profiler.phase("process_obs"):
+        obs = process_obs(player, agent_prev_obs[player], step, raw_obs)
     agent_prev_obs[player] = obs
     agent.step = step
     if obs["real_env_steps"] < 0:
@@ -35,7 +51,12 @@ def agent_fn(observation, configurations):
     else:
         actions = agent.act(step, obs, remainingOverageTime)
 
-    return process_action(actions)
+    with profiler.phase("process_action"):
+        actions = process_action(actions)
+    profiler.end_turn(fallbacks=agent.turn_budget.fallbacks, path_cache=agent.path_cache.stats())
+    if obs["real_env_steps"] >= agent.env_cfg.max_episode_length - 1:  # the process is killed rather than exited
+        profiler.summary()
+    return actions
 
 
 if __name__ == "__main__":
@@ -56,14 +77,14 @@ if __name__ == "__main__":
     i = 0
     while True:
         inputs = read_input()
-        obs = json.loads(inputs)
+        obs = loads(inputs)
 
         observation = Namespace(
-            **dict(step=obs["step"], obs=json.dumps(obs["obs"]), remainingOverageTime=obs["remainingOverageTime"],
+            **dict(step=obs["step"], obs=obs["obs"], remainingOverageTime=obs["remainingOverageTime"],
                    player=obs["player"], info=obs["info"]))
         if i == 0:
             configurations = obs["info"]["env_cfg"]
         i += 1
         actions = agent_fn(observation, dict(env_cfg=configurations))
         # send actions to engine
-        print(json.dumps(actions))
+        print(dumps(actions))